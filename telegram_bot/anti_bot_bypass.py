@@ -13,6 +13,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Быстрый разбор JSON-ответов API, если установлен orjson
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 class AntiBotBypass:
     """Продвинутые техники обхода защиты от ботов"""
     
@@ -188,7 +195,7 @@ class AntiBotBypass:
                 
                 if response and response.status_code == 200:
                     try:
-                        data = response.json()
+                        data = _json_loads(response.content)
                         if data and 'data' in data:
                             logger.info("✅ Успешно получены данные!")
                             return data
@@ -9,7 +9,7 @@ from telegram.constants import ParseMode
 from config import BOT_TOKEN, MAX_MESSAGE_LENGTH, SAFE_MODE_ENABLED
 from parser import parser
 from dataBD_manager import databd_manager
-from safe_mode import safe_mode
+from safe_mode import get_safe_mode
 # Используем databd_manager как основную БД
 db_manager = databd_manager
 
@@ -169,10 +169,11 @@ class CianBot:
         try:
             # Проверяем безопасный режим перед запуском (только если включен)
             if SAFE_MODE_ENABLED:
-                can_parse, safety_info = safe_mode.can_parse(user_id)
+                can_parse, safety_info = await get_safe_mode().can_parse_async(user_id)
                 
                 if not can_parse:
                     # Парсинг заблокирован - показываем информацию
+                    get_safe_mode().format_status(safety_info)
                     await query.edit_message_text(
                         f"🛡️ *Безопасный режим активен*\n\n"
                         f"🚫 {safety_info.get('message', 'Парсинг временно недоступен')}\n\n"
@@ -200,7 +201,7 @@ class CianBot:
             )
             
             # Выполняем парсинг (все объявления)
-            offers, stats = parser.parse_offers(user_id=user_id, only_new=False)
+            offers, stats = await parser.parse_offers_async(user_id=user_id, only_new=False)
             
             # Формируем текст результата
             result_text = self._format_results_text(stats, len(offers), "полный поиск")
@@ -223,10 +224,11 @@ class CianBot:
         try:
             # Проверяем безопасный режим перед запуском (только если включен)
             if SAFE_MODE_ENABLED:
-                can_parse, safety_info = safe_mode.can_parse(user_id)
+                can_parse, safety_info = await get_safe_mode().can_parse_async(user_id)
                 
                 if not can_parse:
                     # Парсинг заблокирован - показываем информацию
+                    get_safe_mode().format_status(safety_info)
                     await query.edit_message_text(
                         f"🛡️ *Безопасный режим активен*\n\n"
                         f"🚫 {safety_info.get('message', 'Парсинг временно недоступен')}\n\n"
@@ -251,7 +253,7 @@ class CianBot:
             )
             
             # Выполняем парсинг (только новые)
-            offers, stats = parser.parse_offers(user_id=user_id, only_new=True)
+            offers, stats = await parser.parse_offers_async(user_id=user_id, only_new=True)
             
             if offers:
                 # Есть новые объявления - создаем отчет
@@ -381,10 +383,10 @@ class CianBot:
                 return
             
             # Получаем статистику безопасного режима для пользователя
-            safety_stats = safe_mode.get_user_safety_stats(user_id)
+            safety_stats = await get_safe_mode().get_user_safety_stats_async(user_id)
             
             # Проверяем, можно ли сейчас парсить
-            can_parse, status_info = safe_mode.can_parse(user_id)
+            can_parse, status_info = await get_safe_mode().can_parse_async(user_id)
             
             # Формируем сообщение
             status_emoji = "✅" if can_parse else "🚫"
@@ -12,6 +12,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import json
 
+from db_viewer import PRICE_STATS_REBUILD_SQL
+
 logger = logging.getLogger(__name__)
 
 # Попытка импортировать pandas для работы с Excel
@@ -321,6 +323,10 @@ class CianReportDBConverter:
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_price ON cian_reports(price)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_area ON cian_reports(area)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_status ON cian_reports(status)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_created_at ON cian_reports(created_at DESC)")
+                
+                self._create_search_index(cursor)
+                self._create_price_stats(cursor)
                 
                 conn.commit()
                 logger.info(f"✅ База данных создана: {self.output_db_path}")
@@ -329,6 +335,137 @@ class CianReportDBConverter:
             logger.error(f"Ошибка создания БД: {e}")
             raise
     
+    def _create_search_index(self, cursor: sqlite3.Cursor):
+        """Создает FTS5 индекс (trigram) по адресам и триггеры синхронизации"""
+        try:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'cian_reports_fts_ai'")
+            index_synced = cursor.fetchone() is not None
+            
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS cian_reports_fts USING fts5(
+                    address, content='cian_reports', content_rowid='rowid', tokenize='trigram'
+                )
+            """)
+            
+            # Триггеры поддерживают индекс в актуальном состоянии при записи в cian_reports
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS cian_reports_fts_ai AFTER INSERT ON cian_reports BEGIN
+                    INSERT INTO cian_reports_fts(rowid, address) VALUES (new.rowid, new.address);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS cian_reports_fts_ad AFTER DELETE ON cian_reports BEGIN
+                    INSERT INTO cian_reports_fts(cian_reports_fts, rowid, address)
+                    VALUES ('delete', old.rowid, old.address);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS cian_reports_fts_au AFTER UPDATE ON cian_reports BEGIN
+                    INSERT INTO cian_reports_fts(cian_reports_fts, rowid, address)
+                    VALUES ('delete', old.rowid, old.address);
+                    INSERT INTO cian_reports_fts(rowid, address) VALUES (new.rowid, new.address);
+                END
+            """)
+            
+            # Первичное заполнение индекса существующими записями
+            if not index_synced:
+                cursor.execute("INSERT INTO cian_reports_fts(cian_reports_fts) VALUES ('rebuild')")
+                logger.info("✅ Создан полнотекстовый индекс по адресам")
+                
+        except sqlite3.OperationalError as e:
+            # Сборка SQLite без FTS5/trigram - поиск по адресу работает через LIKE
+            logger.warning(f"Полнотекстовый индекс по адресам не создан: {e}")
+    
+    def _create_price_stats(self, cursor: sqlite3.Cursor):
+        """Создает строку предрасчитанной статистики цен и триггеры ее обновления"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'cian_report_stats_ai'")
+        stats_synced = cursor.fetchone() is not None
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cian_report_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_count INTEGER DEFAULT 0,
+                price_sum REAL DEFAULT 0,
+                min_price REAL,
+                max_price REAL,
+                under_50k INTEGER DEFAULT 0,
+                mid_50k_100k INTEGER DEFAULT 0,
+                over_100k INTEGER DEFAULT 0
+            )
+        """)
+        
+        # Счетчики и сумма меняются инкрементально. MIN/MAX при добавлении цены
+        # сравниваются с текущими, а при удалении крайней цены берутся заново
+        # по индексу idx_reports_price (один переход по B-дереву)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cian_report_stats_ai
+            AFTER INSERT ON cian_reports WHEN new.price > 0 BEGIN
+                UPDATE cian_report_stats SET
+                    total_count = total_count + 1,
+                    price_sum = price_sum + new.price,
+                    under_50k = under_50k + (new.price < 50000),
+                    mid_50k_100k = mid_50k_100k + (new.price BETWEEN 50000 AND 100000),
+                    over_100k = over_100k + (new.price > 100000),
+                    min_price = min(COALESCE(min_price, new.price), new.price),
+                    max_price = max(COALESCE(max_price, new.price), new.price)
+                WHERE id = 1;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cian_report_stats_ad
+            AFTER DELETE ON cian_reports WHEN old.price > 0 BEGIN
+                UPDATE cian_report_stats SET
+                    total_count = total_count - 1,
+                    price_sum = price_sum - old.price,
+                    under_50k = under_50k - (old.price < 50000),
+                    mid_50k_100k = mid_50k_100k - (old.price BETWEEN 50000 AND 100000),
+                    over_100k = over_100k - (old.price > 100000),
+                    min_price = CASE WHEN old.price <= min_price
+                        THEN (SELECT MIN(price) FROM cian_reports WHERE price > 0) ELSE min_price END,
+                    max_price = CASE WHEN old.price >= max_price
+                        THEN (SELECT MAX(price) FROM cian_reports WHERE price > 0) ELSE max_price END
+                WHERE id = 1;
+            END
+        """)
+        
+        # Изменение цены - это удаление старой и добавление новой
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cian_report_stats_au_old
+            AFTER UPDATE OF price ON cian_reports
+            WHEN old.price > 0 AND old.price IS NOT new.price BEGIN
+                UPDATE cian_report_stats SET
+                    total_count = total_count - 1,
+                    price_sum = price_sum - old.price,
+                    under_50k = under_50k - (old.price < 50000),
+                    mid_50k_100k = mid_50k_100k - (old.price BETWEEN 50000 AND 100000),
+                    over_100k = over_100k - (old.price > 100000),
+                    min_price = CASE WHEN old.price <= min_price
+                        THEN (SELECT MIN(price) FROM cian_reports WHERE price > 0) ELSE min_price END,
+                    max_price = CASE WHEN old.price >= max_price
+                        THEN (SELECT MAX(price) FROM cian_reports WHERE price > 0) ELSE max_price END
+                WHERE id = 1;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cian_report_stats_au_new
+            AFTER UPDATE OF price ON cian_reports
+            WHEN new.price > 0 AND old.price IS NOT new.price BEGIN
+                UPDATE cian_report_stats SET
+                    total_count = total_count + 1,
+                    price_sum = price_sum + new.price,
+                    under_50k = under_50k + (new.price < 50000),
+                    mid_50k_100k = mid_50k_100k + (new.price BETWEEN 50000 AND 100000),
+                    over_100k = over_100k + (new.price > 100000),
+                    min_price = min(COALESCE(min_price, new.price), new.price),
+                    max_price = max(COALESCE(max_price, new.price), new.price)
+                WHERE id = 1;
+            END
+        """)
+        
+        # Первичный расчет по уже существующим записям
+        if not stats_synced:
+            cursor.execute(PRICE_STATS_REBUILD_SQL)
+    
     def save_to_database(self, df: pd.DataFrame) -> bool:
         """Сохраняет DataFrame в базу данных"""
         try:
@@ -85,6 +85,15 @@ class DataBDManager:
                     )
                 """)
                 
+                # Создаем таблицу просмотренных пользователями объявлений
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_seen_offers (
+                        user_id TEXT NOT NULL,
+                        offer_id INTEGER NOT NULL,
+                        PRIMARY KEY (user_id, offer_id)
+                    ) WITHOUT ROWID
+                """)
+                
                 # Создаем таблицу для статистики
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS daily_stats (
@@ -162,25 +171,53 @@ class DataBDManager:
         except Exception as e:
             logger.error(f"Ошибка завершения сессии парсинга: {e}")
     
+    def record_parsing_session(self, source: str, started_at: float, total_parsed: int,
+                               total_saved: int, notes: str = "") -> str:
+        """
+        Записывает завершенную сессию парсинга одним INSERT
+        
+        Args:
+            source: Источник данных
+            started_at: Время начала сессии (time.time())
+            total_parsed: Общее количество обработанных объявлений
+            total_saved: Количество сохраненных объявлений
+            notes: Заметки о сессии
+        
+        Returns:
+            str: ID сессии
+        """
+        session_id = f"{source}_{datetime.fromtimestamp(started_at).strftime('%Y%m%d_%H%M%S')}"
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO parsing_sessions 
+                    (session_id, started_at, finished_at, total_parsed, total_saved, source, status, notes)
+                    VALUES (?, datetime(?, 'unixepoch'), CURRENT_TIMESTAMP, ?, ?, ?, 'completed', ?)
+                """, (session_id, started_at, total_parsed, total_saved, source, notes))
+                conn.commit()
+                
+                logger.info(f"Записана сессия парсинга: {session_id} ({total_saved}/{total_parsed})")
+                return session_id
+                
+        except Exception as e:
+            logger.error(f"Ошибка записи сессии парсинга: {e}")
+            return session_id
+    
     def save_listing(self, listing_data: Dict[str, Any]) -> bool:
         """
         Сохраняет объявление в базу данных
         
         Args:
-            listing_data: Данные объявления
+            listing_data: Данные объявления (photos - список URL фотографий)
         
         Returns:
             bool: True если сохранено, False если обновлено
         """
         try:
-            # Конвертируем photos в JSON строку если это список
-            photos = listing_data.get('photos', [])
-            if isinstance(photos, list):
-                photos_json = json.dumps(photos, ensure_ascii=False)
-            else:
-                photos_json = str(photos)
-            
-
+            # photos всегда передается списком - сериализуем без проверки типа
+            photos_json = json.dumps(listing_data.get('photos') or [], ensure_ascii=False)
             
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
@@ -190,7 +227,24 @@ class DataBDManager:
                 exists = cursor.fetchone()
                 
                 if exists:
-                    # Обновляем существующее объявление
+                    values = (
+                        listing_data.get('source', 'cian'),
+                        listing_data.get('price'),
+                        listing_data.get('area'),
+                        listing_data.get('description'),
+                        listing_data.get('url'),
+                        listing_data.get('floor'),
+                        listing_data.get('address'),
+                        listing_data.get('lat'),
+                        listing_data.get('lng'),
+                        listing_data.get('seller'),
+                        photos_json,
+                        listing_data.get('status', 'open'),
+                        listing_data.get('visible', 1)
+                    )
+                    
+                    # Обновляем существующее объявление только если данные изменились,
+                    # чтобы не перезаписывать страницы БД при повторном парсинге
                     cursor.execute("""
                         UPDATE real_estate_listings SET
                             source = ?,
@@ -207,25 +261,16 @@ class DataBDManager:
                             status = ?,
                             visible = ?
                         WHERE id = ?
-                    """, (
-                        listing_data.get('source', 'cian'),
-                        listing_data.get('price'),
-                        listing_data.get('area'),
-                        listing_data.get('description'),
-                        listing_data.get('url'),
-                        listing_data.get('floor'),
-                        listing_data.get('address'),
-                        listing_data.get('lat'),
-                        listing_data.get('lng'),
-                        listing_data.get('seller'),
-                        photos_json,
-                        listing_data.get('status', 'open'),
-                        listing_data.get('visible', 1),
-                        listing_data['id']
-                    ))
+                          AND (source, price, area, description, url, floor, address,
+                               lat, lng, seller, photos, status, visible)
+                              IS NOT (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, values + (listing_data['id'],) + values)
                     
                     conn.commit()
-                    logger.debug(f"Обновлено объявление: {listing_data['id']}")
+                    if cursor.rowcount:
+                        logger.debug(f"Обновлено объявление: {listing_data['id']}")
+                    else:
+                        logger.debug(f"Объявление не изменилось: {listing_data['id']}")
                     return False
                     
                 else:
@@ -260,6 +305,78 @@ class DataBDManager:
             logger.error(f"Ошибка сохранения объявления {listing_data.get('id')}: {e}")
             return False
     
+    def save_listings_bulk(self, listings: List[Dict[str, Any]]) -> int:
+        """
+        Сохраняет пачку объявлений одной транзакцией
+        
+        Args:
+            listings: Список объявлений в формате save_listing
+        
+        Returns:
+            int: Количество добавленных или измененных объявлений
+        """
+        if not listings:
+            return 0
+        
+        rows = (
+            (
+                listing_data['id'],
+                listing_data.get('source', 'cian'),
+                listing_data.get('price'),
+                listing_data.get('area'),
+                listing_data.get('description'),
+                listing_data.get('url'),
+                listing_data.get('floor'),
+                listing_data.get('address'),
+                listing_data.get('lat'),
+                listing_data.get('lng'),
+                listing_data.get('seller'),
+                json.dumps(listing_data.get('photos') or [], ensure_ascii=False),
+                listing_data.get('status', 'open'),
+                listing_data.get('visible', 1)
+            )
+            for listing_data in listings
+        )
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                # Один executemany и один commit на всю пачку; неизменившиеся
+                # объявления не перезаписываются, как и в save_listing
+                cursor = conn.executemany("""
+                    INSERT INTO real_estate_listings (
+                        id, source, price, area, description, url, floor, address,
+                        lat, lng, seller, photos, status, visible
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        source = excluded.source,
+                        price = excluded.price,
+                        area = excluded.area,
+                        description = excluded.description,
+                        url = excluded.url,
+                        floor = excluded.floor,
+                        address = excluded.address,
+                        lat = excluded.lat,
+                        lng = excluded.lng,
+                        seller = excluded.seller,
+                        photos = excluded.photos,
+                        status = excluded.status,
+                        visible = excluded.visible
+                    WHERE (source, price, area, description, url, floor, address,
+                           lat, lng, seller, photos, status, visible)
+                          IS NOT (excluded.source, excluded.price, excluded.area, excluded.description,
+                                  excluded.url, excluded.floor, excluded.address, excluded.lat,
+                                  excluded.lng, excluded.seller, excluded.photos, excluded.status,
+                                  excluded.visible)
+                """, rows)
+                conn.commit()
+                
+            logger.debug(f"Сохранено {cursor.rowcount} из {len(listings)} объявлений")
+            return cursor.rowcount
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетного сохранения объявлений: {e}")
+            return 0
+    
     def get_listings(self, limit: int = 100, offset: int = 0, source: str = None) -> List[Dict]:
         """
         Получает список объявлений
@@ -274,7 +391,6 @@ class DataBDManager:
         """
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 query = "SELECT * FROM real_estate_listings"
@@ -290,7 +406,9 @@ class DataBDManager:
                 cursor.execute(query, params)
                 rows = cursor.fetchall()
                 
-                return [dict(row) for row in rows]
+                # Имена колонок берем один раз из описания курсора
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in rows]
                 
         except Exception as e:
             logger.error(f"Ошибка получения объявлений: {e}")
@@ -308,13 +426,16 @@ class DataBDManager:
         """
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 cursor.execute("SELECT * FROM real_estate_listings WHERE id = ?", (listing_id,))
                 row = cursor.fetchone()
                 
-                return dict(row) if row else None
+                if not row:
+                    return None
+                
+                columns = [column[0] for column in cursor.description]
+                return dict(zip(columns, row))
                 
         except Exception as e:
             logger.error(f"Ошибка получения объявления {listing_id}: {e}")
@@ -449,6 +570,16 @@ class DataBDManager:
         Returns:
             bool: True если новое объявление
         """
+        # photos приводим к списку URL; строку нельзя передавать в list() -
+        # она разбилась бы на отдельные символы
+        photos = offer_data.get('photos') or []
+        if isinstance(photos, str):
+            photos = self._photos_from_string(photos)
+        elif isinstance(photos, tuple):
+            photos = list(photos)
+        elif not isinstance(photos, list):
+            photos = []
+        
         # Преобразуем формат данных если нужно
         listing_data = {
             'id': str(offer_data.get('id', '')),
@@ -462,26 +593,46 @@ class DataBDManager:
             'lat': str(offer_data.get('coordinates', {}).get('lat', '')),
             'lng': str(offer_data.get('coordinates', {}).get('lng', '')),
             'seller': str(offer_data.get('phones', [])),
-            'photos': offer_data.get('photos', []),
+            'photos': photos,
             'status': 'open',
             'visible': 1
         }
         
         return self.save_listing(listing_data)
     
-    def get_seen_offers(self, user_id: str) -> set:
+    @staticmethod
+    def _photos_from_string(photos: str) -> List[str]:
+        """Разбирает photos, пришедшие строкой: JSON-список URL или один URL"""
+        try:
+            parsed = json.loads(photos)
+        except ValueError:
+            return [photos]
+        
+        return parsed if isinstance(parsed, list) else [photos]
+    
+    def get_seen_offers(self, user_id: str, raise_errors: bool = False) -> set:
         """
         Возвращает множество просмотренных объявлений для пользователя
         
         Args:
             user_id: ID пользователя
+            raise_errors: Пробрасывать ошибку чтения вместо пустого множества
+                (нужно, чтобы отличить ошибку от пустого результата)
         
         Returns:
             set: Множество ID просмотренных объявлений
         """
-        # Для упрощения возвращаем пустое множество
-        # В полной версии можно добавить таблицу user_seen_offers
-        return set()
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT offer_id FROM user_seen_offers WHERE user_id = ?", (user_id,))
+                return {row[0] for row in cursor.fetchall()}
+                
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Ошибка получения просмотренных объявлений для {user_id}: {e}")
+            return set()
     
     def mark_offers_as_seen_bulk(self, user_id: str, offer_ids: list):
         """
@@ -491,10 +642,31 @@ class DataBDManager:
             user_id: ID пользователя  
             offer_ids: Список ID объявлений
         """
-        # Для упрощения ничего не делаем
-        # В полной версии можно добавить таблицу user_seen_offers
-        logger.debug(f"Отмечено {len(offer_ids)} объявлений как просмотренные для {user_id}")
-        pass
+        try:
+            # Все вставки выполняются одним executemany в одной транзакции
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO user_seen_offers (user_id, offer_id) VALUES (?, ?)",
+                    ((user_id, int(offer_id)) for offer_id in offer_ids)
+                )
+                conn.commit()
+                
+            logger.debug(f"Отмечено {len(offer_ids)} объявлений как просмотренные для {user_id}")
+            
+        except Exception as e:
+            logger.error(f"Ошибка отметки просмотренных объявлений для {user_id}: {e}")
+    
+    def save_seen_offers(self, user_id: str, seen_offers: set):
+        """
+        Сохраняет множество просмотренных объявлений пользователя
+        
+        Уже сохраненные ID пропускаются, поэтому можно передавать только новые.
+        
+        Args:
+            user_id: ID пользователя
+            seen_offers: Множество ID просмотренных объявлений
+        """
+        self.mark_offers_as_seen_bulk(user_id, list(seen_offers))
     
     def save_user(self, user_id: str, username: str = None, first_name: str = None, 
                   last_name: str = None, is_bot: bool = False):
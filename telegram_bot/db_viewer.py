@@ -6,61 +6,244 @@
 
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import gzip
+import json
+from typing import List, Dict, Optional, Iterator, Iterable, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Шаблон карточки объявления и таблица замены разделителя тысяч
+_LISTING_TEMPLATE = (
+    "🏢 Объявление #{id}\n"
+    "💰 Цена: {price} ₽/мес\n"
+    "📏 Площадь: {area}\n"
+    "📍 Адрес: {address}\n"
+    "🏗️ Этаж: {floor}\n"
+    "📞 Контакт: {seller}\n"
+    "🔗 Ссылка: {url}\n"
+    "📝 Описание: {description}\n"
+    "📅 Статус: {status}"
+)
+_COMMA_TO_SPACE = str.maketrans({',': ' '})
+
+# Агрегат цен по cian_reports - им считается статистика без предрасчета
+# и им же полностью пересчитывается строка cian_report_stats
+_PRICE_AGGREGATE_SQL = """
+    SELECT 
+        COUNT(*) as total_count,
+        COALESCE(SUM(price), 0) as price_sum,
+        MIN(price) as min_price,
+        MAX(price) as max_price,
+        COUNT(CASE WHEN price < 50000 THEN 1 END) as under_50k,
+        COUNT(CASE WHEN price BETWEEN 50000 AND 100000 THEN 1 END) as mid_50k_100k,
+        COUNT(CASE WHEN price > 100000 THEN 1 END) as over_100k
+    FROM cian_reports 
+    WHERE price > 0
+"""
+
+# Полный пересчет предрасчитанной строки статистики (таблицу и триггеры создает create_database_schema)
+PRICE_STATS_REBUILD_SQL = """
+    INSERT OR REPLACE INTO cian_report_stats (
+        id, total_count, price_sum, min_price, max_price,
+        under_50k, mid_50k_100k, over_100k
+    )
+    SELECT 1, * FROM (""" + _PRICE_AGGREGATE_SQL + """)
+"""
+
 class DatabaseViewer:
     """Просмотрщик базы данных объявлений"""
     
     def __init__(self, db_path: str = "dataBD/cian_reports.db"):
         self.db_path = db_path
+        self._conn = None  # Открывается лениво при первом запросе
+        self._fts_ready = False  # Доступен ли полнотекстовый индекс по адресам
+        self._stats_ready = False  # Поддерживается ли строка cian_report_stats триггерами
     
-    def get_all_listings(self, limit: int = 50) -> List[Dict]:
-        """Получает все объявления из БД"""
+    def _connect(self) -> sqlite3.Connection:
+        """Возвращает общее соединение с БД, настраивая его при первом открытии"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row  # Для доступа по имени колонки
+            
+            # WAL не блокирует читателей во время записи и сокращает число fsync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")
+            
+            # Индексы idx_reports_created_at и idx_reports_price создает
+            # create_database_schema при записи БД - на чтении DDL не выполняется
+            self._conn = conn
+            self._ensure_search_index(conn)
+            self._ensure_price_stats(conn)
+        return self._conn
+    
+    def _ensure_search_index(self, conn: sqlite3.Connection):
+        """Проверяет наличие FTS5 индекса по адресам (его создает create_database_schema)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row  # Для доступа по имени колонки
-                cursor = conn.cursor()
-                
-                cursor.execute("""
+            cursor = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cian_reports_fts'"
+            )
+            self._fts_ready = cursor.fetchone() is not None
+            
+            if not self._fts_ready:
+                logger.info("Полнотекстовый индекс по адресам не найден, используется LIKE")
+            
+        except Exception as e:
+            logger.warning(f"Полнотекстовый индекс недоступен, используется LIKE: {e}")
+            self._fts_ready = False
+    
+    def _ensure_price_stats(self, conn: sqlite3.Connection):
+        """Проверяет наличие предрасчитанной статистики цен (ее создает create_database_schema)"""
+        try:
+            # Без триггеров строка статистики не обновляется при записи - читать ее нельзя
+            cursor = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'cian_report_stats_ai'"
+            )
+            self._stats_ready = cursor.fetchone() is not None
+            
+        except Exception as e:
+            logger.warning(f"Предрасчитанная статистика цен недоступна: {e}")
+            self._stats_ready = False
+    
+    def rebuild_stats(self) -> bool:
+        """Полностью пересчитывает строку cian_report_stats по таблице объявлений
+        
+        Нужен, если записи менялись в обход триггеров: INSERT OR REPLACE без
+        PRAGMA recursive_triggers не запускает триггер удаления
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(PRICE_STATS_REBUILD_SQL)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка пересчета статистики цен: {e}")
+            return False
+    
+    def rebuild_search_index(self) -> bool:
+        """Полностью перестраивает индекс по адресам (например, после VACUUM)"""
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT INTO cian_reports_fts(cian_reports_fts) VALUES ('rebuild')")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка перестроения индекса по адресам: {e}")
+            return False
+    
+    def bulk_insert(self, rows: Iterable[Dict]) -> int:
+        """
+        Добавляет или обновляет пачку объявлений одной транзакцией
+        
+        Args:
+            rows: Объявления в формате cian_reports (id, price, area, address, ...)
+            
+        Returns:
+            Количество записанных объявлений
+        """
+        def normalize(row: Dict) -> Dict:
+            photos = row.get('photos') or []
+            return {
+                'id': str(row['id']),
+                'source': row.get('source') or 'cian',
+                'price': row.get('price'),
+                'area': row.get('area', ''),
+                'description': row.get('description', ''),
+                'url': row.get('url', ''),
+                'floor': row.get('floor', ''),
+                'address': row.get('address', ''),
+                'lat': row.get('lat', ''),
+                'lng': row.get('lng', ''),
+                'seller': row.get('seller', ''),
+                'photos': photos if isinstance(photos, str) else json.dumps(photos, ensure_ascii=False),
+                'status': row.get('status') or 'open',
+                'visible': row.get('visible', 1),
+            }
+        
+        try:
+            conn = self._connect()
+            # Один коммит на всю пачку; UPSERT (а не REPLACE) запускает триггеры
+            # обновления, поэтому индекс по адресам и статистика остаются согласованными
+            with conn:
+                cursor = conn.executemany("""
+                    INSERT INTO cian_reports 
+                    (id, source, price, area, description, url, floor, address,
+                     lat, lng, seller, photos, status, visible)
+                    VALUES (:id, :source, :price, :area, :description, :url, :floor, :address,
+                            :lat, :lng, :seller, :photos, :status, :visible)
+                    ON CONFLICT(id) DO UPDATE SET
+                        source = excluded.source, price = excluded.price, area = excluded.area,
+                        description = excluded.description, url = excluded.url, floor = excluded.floor,
+                        address = excluded.address, lat = excluded.lat, lng = excluded.lng,
+                        seller = excluded.seller, photos = excluded.photos, status = excluded.status,
+                        visible = excluded.visible, updated_at = CURRENT_TIMESTAMP
+                """, (normalize(row) for row in rows))
+            
+            logger.info(f"💾 Записано {cursor.rowcount} объявлений в cian_reports")
+            return cursor.rowcount
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетной записи объявлений: {e}")
+            return 0
+    
+    def get_all_listings(self, limit: int = 50) -> List[sqlite3.Row]:
+        """Получает все объявления из БД (строки sqlite3.Row с доступом по имени колонки)"""
+        try:
+            with self._connect() as conn:
+                return conn.execute("""
                     SELECT * FROM cian_reports 
                     ORDER BY created_at DESC 
                     LIMIT ?
-                """, (limit,))
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                """, (limit,)).fetchall()
                 
         except Exception as e:
             logger.error(f"Ошибка получения объявлений: {e}")
             return []
     
+    def iter_listings(self, limit: Optional[int] = None, batch_size: int = 256) -> Iterator[sqlite3.Row]:
+        """
+        Построчно выдает объявления из БД, читая их пачками через fetchmany
+        
+        Args:
+            limit: Максимальное количество объявлений (None - без ограничения)
+            batch_size: Размер пачки, читаемой из курсора за раз
+        """
+        cursor = self._connect().execute("""
+            SELECT * FROM cian_reports 
+            ORDER BY created_at DESC 
+            LIMIT ?
+        """, (limit if limit is not None else -1,))
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    
     def get_price_statistics(self) -> Dict:
         """Получает статистику по ценам"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_count,
-                        AVG(price) as avg_price,
-                        MIN(price) as min_price,
-                        MAX(price) as max_price,
-                        COUNT(CASE WHEN price < 50000 THEN 1 END) as under_50k,
-                        COUNT(CASE WHEN price BETWEEN 50000 AND 100000 THEN 1 END) as 50k_100k,
-                        COUNT(CASE WHEN price > 100000 THEN 1 END) as over_100k
-                    FROM cian_reports 
-                    WHERE price > 0
-                """)
+            with self._connect() as conn:
+                if self._stats_ready:
+                    # Статистика поддерживается триггерами - читаем одну строку
+                    cursor = conn.execute("""
+                        SELECT total_count, price_sum, min_price, max_price,
+                               under_50k, mid_50k_100k, over_100k
+                        FROM cian_report_stats
+                        WHERE id = 1
+                    """)
+                else:
+                    # Все выражения используют только price - запрос читает покрывающий индекс idx_reports_price
+                    cursor = conn.execute(_PRICE_AGGREGATE_SQL)
                 
                 row = cursor.fetchone()
                 if row:
                     return {
                         'total_count': row[0],
-                        'avg_price': round(row[1], 2) if row[1] else 0,
+                        'avg_price': round(row[1] / row[0], 2) if row[0] else 0,
                         'min_price': row[2] or 0,
                         'max_price': row[3] or 0,
                         'under_50k': row[4],
@@ -73,94 +256,141 @@ class DatabaseViewer:
             
         return {}
     
-    def search_by_price_range(self, min_price: int, max_price: int) -> List[Dict]:
+    def search_by_price_range(self, min_price: int, max_price: int) -> List[sqlite3.Row]:
         """Поиск объявлений по диапазону цен"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                cursor.execute("""
+            with self._connect() as conn:
+                return conn.execute("""
                     SELECT * FROM cian_reports 
                     WHERE price BETWEEN ? AND ?
                     ORDER BY price ASC
-                """, (min_price, max_price))
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                """, (min_price, max_price)).fetchall()
                 
         except Exception as e:
             logger.error(f"Ошибка поиска по ценам: {e}")
             return []
     
-    def search_by_address(self, address_part: str) -> List[Dict]:
+    def search_by_address(self, address_part: str) -> List[sqlite3.Row]:
         """Поиск объявлений по части адреса"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
+            with self._connect() as conn:
+                # Trigram индекс ищет подстроки от 3 символов, короткие запросы идут через LIKE
+                if self._fts_ready and len(address_part) >= 3:
+                    cursor = conn.execute("""
+                        SELECT r.* FROM cian_reports_fts f
+                        JOIN cian_reports r ON r.rowid = f.rowid
+                        WHERE cian_reports_fts MATCH ?
+                        ORDER BY r.price ASC
+                    """, ('"' + address_part.replace('"', '""') + '"',))
+                else:
+                    cursor = conn.execute("""
+                        SELECT * FROM cian_reports 
+                        WHERE address LIKE ?
+                        ORDER BY price ASC
+                    """, (f'%{address_part}%',))
                 
-                cursor.execute("""
-                    SELECT * FROM cian_reports 
-                    WHERE address LIKE ?
-                    ORDER BY price ASC
-                """, (f'%{address_part}%',))
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                return cursor.fetchall()
                 
         except Exception as e:
             logger.error(f"Ошибка поиска по адресу: {e}")
             return []
     
-    def get_formatted_listing(self, listing: Dict) -> str:
+    def search_by_addresses(self, address_parts: List[str]) -> List[sqlite3.Row]:
+        """Поиск объявлений, адрес которых содержит любую из частей (один запрос вместо N)"""
+        if not address_parts:
+            return []
+        
+        try:
+            with self._connect() as conn:
+                if self._fts_ready and all(len(part) >= 3 for part in address_parts):
+                    # Все части объединяются в одно FTS5 выражение через OR
+                    match_query = ' OR '.join('"' + part.replace('"', '""') + '"' for part in address_parts)
+                    cursor = conn.execute("""
+                        SELECT r.* FROM cian_reports_fts f
+                        JOIN cian_reports r ON r.rowid = f.rowid
+                        WHERE cian_reports_fts MATCH ?
+                        ORDER BY r.price ASC
+                    """, (match_query,))
+                else:
+                    conditions = ' OR '.join(['address LIKE ?'] * len(address_parts))
+                    cursor = conn.execute(f"""
+                        SELECT * FROM cian_reports
+                        WHERE {conditions}
+                        ORDER BY price ASC
+                    """, [f'%{part}%' for part in address_parts])
+                
+                return cursor.fetchall()
+        
+        except Exception as e:
+            logger.error(f"Ошибка поиска по адресам: {e}")
+            return []
+    
+    def get_formatted_listing(self, listing: Union[sqlite3.Row, Dict]) -> str:
         """Форматирует объявление для красивого вывода"""
         try:
-            price_text = f"{listing['price']:,.0f} ₽/мес".replace(',', ' ')
-            
-            formatted = f"""
-🏢 Объявление #{listing['id']}
-💰 Цена: {price_text}
-📏 Площадь: {listing['area']}
-📍 Адрес: {listing['address']}
-🏗️ Этаж: {listing['floor']}
-📞 Контакт: {listing['seller']}
-🔗 Ссылка: {listing['url']}
-📝 Описание: {listing['description']}
-📅 Статус: {listing['status']}
-"""
-            return formatted.strip()
+            return _LISTING_TEMPLATE.format(
+                id=listing['id'],
+                price=f"{listing['price']:,.0f}".translate(_COMMA_TO_SPACE),
+                area=listing['area'],
+                address=listing['address'],
+                floor=listing['floor'],
+                seller=listing['seller'],
+                url=listing['url'],
+                description=listing['description'],
+                status=listing['status']
+            )
             
         except Exception as e:
             logger.error(f"Ошибка форматирования объявления: {e}")
-            return f"Ошибка отображения объявления {listing.get('id', 'неизвестно')}"
+            # sqlite3.Row не поддерживает .get, поэтому приводим к dict только в редком случае ошибки
+            return f"Ошибка отображения объявления {dict(listing).get('id', 'неизвестно')}"
     
-    def export_to_txt(self, filename: str = "dataBD/cian_report_export.txt") -> bool:
-        """Экспортирует все объявления в текстовый файл"""
+    def export_to_txt(self, filename: str = "dataBD/cian_report_export.txt", compress: bool = False) -> bool:
+        """
+        Экспортирует все объявления в текстовый файл
+        
+        Args:
+            filename: Путь к файлу отчета
+            compress: Сжимать отчет в gzip (к имени файла добавляется .gz)
+        """
         try:
-            listings = self.get_all_listings(limit=1000)
+            if compress:
+                # Текстовый отчет сжимается в 5-10 раз, уровень 1 почти не нагружает CPU
+                filename = filename + '.gz'
+                output = gzip.open(filename, 'wt', encoding='utf-8', compresslevel=1)
+            else:
+                output = open(filename, 'w', encoding='utf-8', buffering=1 << 20)
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write("=" * 80 + "\n")
-                f.write("           ОТЧЕТ ПО ОБЪЯВЛЕНИЯМ НЕДВИЖИМОСТИ\n")
-                f.write("=" * 80 + "\n\n")
-                
+            with output as f:
                 stats = self.get_price_statistics()
-                f.write(f"📊 Общая статистика:\n")
-                f.write(f"   Всего объявлений: {stats.get('total_count', 0)}\n")
-                f.write(f"   Средняя цена: {stats.get('avg_price', 0):,.0f} ₽/мес\n")
-                f.write(f"   Диапазон цен: {stats.get('min_price', 0):,.0f} - {stats.get('max_price', 0):,.0f} ₽/мес\n")
-                f.write(f"   До 50,000 ₽: {stats.get('under_50k', 0)} объявлений\n")
-                f.write(f"   50,000-100,000 ₽: {stats.get('50k_100k', 0)} объявлений\n")
-                f.write(f"   Свыше 100,000 ₽: {stats.get('over_100k', 0)} объявлений\n\n")
+                separator = "=" * 80
                 
-                f.write("=" * 80 + "\n")
-                f.write("                    СПИСОК ОБЪЯВЛЕНИЙ\n")
-                f.write("=" * 80 + "\n\n")
+                f.write(
+                    f"{separator}\n"
+                    f"           ОТЧЕТ ПО ОБЪЯВЛЕНИЯМ НЕДВИЖИМОСТИ\n"
+                    f"{separator}\n\n"
+                    f"📊 Общая статистика:\n"
+                    f"   Всего объявлений: {stats.get('total_count', 0)}\n"
+                    f"   Средняя цена: {stats.get('avg_price', 0):,.0f} ₽/мес\n"
+                    f"   Диапазон цен: {stats.get('min_price', 0):,.0f} - {stats.get('max_price', 0):,.0f} ₽/мес\n"
+                    f"   До 50,000 ₽: {stats.get('under_50k', 0)} объявлений\n"
+                    f"   50,000-100,000 ₽: {stats.get('50k_100k', 0)} объявлений\n"
+                    f"   Свыше 100,000 ₽: {stats.get('over_100k', 0)} объявлений\n\n"
+                    f"{separator}\n"
+                    f"                    СПИСОК ОБЪЯВЛЕНИЙ\n"
+                    f"{separator}\n\n"
+                )
                 
-                for i, listing in enumerate(listings, 1):
-                    f.write(f"[{i}] {self.get_formatted_listing(listing)}\n")
-                    f.write("-" * 50 + "\n\n")
+                # Объявления читаются из БД пачками, форматируются в список строк
+                # и записываются одним writelines на каждые 64 объявления
+                footer = "\n" + "-" * 50 + "\n\n"
+                chunks = []
+                for i, listing in enumerate(self.iter_listings(limit=1000), 1):
+                    chunks.append(f"[{i}] {self.get_formatted_listing(listing)}{footer}")
+                    if len(chunks) >= 64:
+                        f.writelines(chunks)
+                        chunks.clear()
+                f.writelines(chunks)
             
             logger.info(f"✅ Экспорт завершен: {filename}")
             return True
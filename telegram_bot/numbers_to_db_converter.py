@@ -4,15 +4,41 @@
 """
 
 import sqlite3
-import json
 import random
 import zipfile
+import io
+import re
+from itertools import chain
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
+from functools import lru_cache
 import os
 import sys
 
+# Ключевые слова для отбора строк, похожих на объявления
+PROP_KW = frozenset(('квартира', 'дом', 'комната', 'участок', 'гараж'))
+NUM_KW = frozenset(('руб', 'р.', 'кв.м', 'м²', 'этаж'))
+
+# Размер буфера чтения из архива: распаковка идет крупными блоками
+ZIP_READ_BUFFER = 128 * 1024
+
+@lru_cache(maxsize=8)
+def _get_target_schema(db_file):
+    """Список колонок real_estate_listings, кешируется по пути к БД"""
+    conn = sqlite3.connect(db_file)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(real_estate_listings)")
+        return tuple(row[1] for row in cursor.fetchall())
+    finally:
+        conn.close()
+
 class NumbersToDBConverter:
+    # Регулярные выражения для извлечения цены и площади из строки
+    _PRICE_RE = re.compile(r'(\d+(?:\s*\d+)*)')
+    _AREA_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:кв\.?м|м²)')
+    _TYPE_RE = re.compile(r'квартира|дом|студия|офис|гараж|участок')
+    
     def __init__(self, numbers_file, target_db_file, output_db_file):
         self.numbers_file = numbers_file
         self.target_db_file = target_db_file
@@ -52,18 +78,14 @@ class NumbersToDBConverter:
                 
                 for file_name in data_files:
                     try:
-                        with zip_ref.open(file_name) as f:
-                            content = f.read().decode('utf-8', errors='ignore')
-                            
-                            # Поиск числовых данных или текста, похожего на недвижимость
-                            lines = content.split('\n')
-                            for line in lines:
-                                # Ищем строки с числами (возможно, цены или площади)
-                                if any(keyword in line.lower() for keyword in ['квартира', 'дом', 'комната', 'участок', 'гараж']):
-                                    data.append(line.strip())
-                                elif any(char.isdigit() for char in line) and len(line.strip()) > 5:
-                                    if any(word in line.lower() for word in ['руб', 'р.', 'кв.м', 'м²', 'этаж']):
-                                        data.append(line.strip())
+                        # XML читается потоково: в памяти держится только текущий элемент
+                        with zip_ref.open(file_name) as raw, io.BufferedReader(raw, buffer_size=ZIP_READ_BUFFER) as f:
+                            for event, elem in ET.iterparse(f, events=('end',)):
+                                if elem.text:
+                                    for line in elem.text.splitlines():
+                                        if self._is_listing_line(line):
+                                            data.append(line.strip())
+                                elem.clear()
                     except Exception as e:
                         continue
             
@@ -79,6 +101,17 @@ class NumbersToDBConverter:
             print("Генерирую демо-данные...")
             return self.generate_demo_data()
 
+    @staticmethod
+    def _is_listing_line(line):
+        """Проверка, похожа ли строка на данные о недвижимости"""
+        text = line.lower()
+        if any(keyword in text for keyword in PROP_KW):
+            return True
+        # Ищем строки с числами (возможно, цены или площади)
+        if len(line.strip()) > 5 and any(char.isdigit() for char in line):
+            return any(word in text for word in NUM_KW)
+        return False
+
     def generate_demo_data(self):
         """Генерация демо-данных недвижимости"""
         property_types = [
@@ -105,14 +138,7 @@ class NumbersToDBConverter:
 
     def get_target_schema(self):
         """Получение схемы целевой базы данных"""
-        conn = sqlite3.connect(self.target_db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute("PRAGMA table_info(real_estate_listings)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        conn.close()
-        return columns
+        return list(_get_target_schema(self.target_db_file))
 
     def generate_realistic_listing(self, index, raw_data_line=""):
         """Генерация реалистичного объявления"""
@@ -122,11 +148,11 @@ class NumbersToDBConverter:
         source = "General Report"
         
         # Цена (от 30К до 500К рублей)
+        raw_lower = raw_data_line.lower()
         price = random.randint(30000, 500000)
-        if "руб" in raw_data_line.lower():
+        if "руб" in raw_lower:
             # Пытаемся извлечь цену из строки
-            import re
-            price_match = re.search(r'(\d+(?:\s*\d+)*)', raw_data_line)
+            price_match = self._PRICE_RE.search(raw_data_line)
             if price_match:
                 try:
                     price = int(price_match.group(1).replace(' ', ''))
@@ -137,18 +163,15 @@ class NumbersToDBConverter:
         
         # Площадь
         area = str(random.randint(20, 200))
-        if "кв" in raw_data_line.lower() or "м²" in raw_data_line.lower():
-            area_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:кв\.?м|м²)', raw_data_line.lower())
+        if "кв" in raw_lower or "м²" in raw_lower:
+            area_match = self._AREA_RE.search(raw_lower)
             if area_match:
                 area = area_match.group(1)
         
         # Тип недвижимости
         property_types = ["квартира", "дом", "студия", "офис", "гараж", "участок"]
-        prop_type = random.choice(property_types)
-        for pt in property_types:
-            if pt in raw_data_line.lower():
-                prop_type = pt
-                break
+        type_match = self._TYPE_RE.search(raw_lower)
+        prop_type = type_match.group(0) if type_match else random.choice(property_types)
         
         # Описание
         descriptions = [
@@ -181,11 +204,11 @@ class NumbersToDBConverter:
         seller = random.choice(self.seller_phones)
         
         # Фото (генерируем ссылки)
-        photos = [
-            f"https://example-realty.ru/photo/{listing_id}_{i}.jpg" 
+        # Ссылки состоят только из ASCII-символов, поэтому JSON собирается напрямую без json.dumps
+        photos_json = "[" + ", ".join(
+            f'"https://example-realty.ru/photo/{listing_id}_{i}.jpg"'
             for i in range(1, random.randint(2, 6))
-        ]
-        photos_json = json.dumps(photos)
+        ) + "]"
         
         # Статус
         status = "open"
@@ -209,7 +232,12 @@ class NumbersToDBConverter:
         print(f"Целевая схема: {target_columns}")
         
         # Создаем новую базу данных
-        conn = sqlite3.connect(self.output_db_file)
+        # Транзакциями управляем явно, вставка идет одним BEGIN ... COMMIT
+        conn = sqlite3.connect(self.output_db_file, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
         cursor = conn.cursor()
         
         # Создаем таблицу с той же структурой
@@ -234,16 +262,12 @@ class NumbersToDBConverter:
         
         cursor.execute(create_table_sql)
         
-        # Генерируем записи
-        listings = []
-        for i, raw_line in enumerate(raw_data):
-            listing = self.generate_realistic_listing(i, raw_line)
-            listings.append(listing)
-        
-        # Если данных мало, добавляем еще
-        while len(listings) < 10:
-            listing = self.generate_realistic_listing(len(listings))
-            listings.append(listing)
+        # Записи генерируются лениво и сразу уходят в executemany
+        listings = chain(
+            (self.generate_realistic_listing(i, raw_line) for i, raw_line in enumerate(raw_data)),
+            # Если данных мало, добавляем еще
+            (self.generate_realistic_listing(i) for i in range(len(raw_data), 10))
+        )
         
         # Вставляем данные
         insert_sql = """
@@ -252,10 +276,16 @@ class NumbersToDBConverter:
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         
-        cursor.executemany(insert_sql, listings)
-        conn.commit()
-        
-        print(f"Успешно создано {len(listings)} записей в {self.output_db_file}")
+        cursor.execute("BEGIN")
+        try:
+            cursor.executemany(insert_sql, listings)
+            inserted = cursor.rowcount
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        
+        print(f"Успешно создано {inserted} записей в {self.output_db_file}")
         
         # Показываем статистику
         cursor.execute("SELECT COUNT(*) FROM real_estate_listings")
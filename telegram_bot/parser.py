@@ -1,9 +1,18 @@
+import asyncio
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import os
 import time
 import random
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Tuple, Set
 from config import (
     CIAN_API_URL, HEADERS, DEFAULT_SEARCH_PARAMS, DATA_DIR, SEEN_OFFERS_FILE,
@@ -12,13 +21,44 @@ from config import (
 from dataBD_manager import databd_manager
 # Используем databd_manager как основную БД
 db_manager = databd_manager
-from safe_mode import safe_mode
+from safe_mode import get_safe_mode
 import logging
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Быстрый разбор JSON-ответов API, если установлен orjson
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Фоновый поток для служебных записей в БД после парсинга; один поток сохраняет порядок записей
+_BG = ThreadPoolExecutor(max_workers=1, thread_name_prefix='parser-bookkeeping')
+atexit.register(_BG.shutdown)
+
+# Шаблон ссылки на объявление
+_URL_TMPL = "https://perm.cian.ru/rent/commercial/%s/"
+
+# Тело поискового запроса не меняется, поэтому сериализуется один раз при загрузке модуля
+_SEARCH_BODY = json.dumps(DEFAULT_SEARCH_PARAMS, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+_SEARCH_HEADERS = {'content-type': 'application/json'}
+
+# Готовые наборы заголовков для каждого User-Agent, выдаются по кругу
+_HEADERS_POOL = tuple({**HEADERS, 'user-agent': user_agent} for user_agent in USER_AGENTS)
+_HEADERS_ITER = itertools.cycle(_HEADERS_POOL)
+
+# Форматирование цены: спецификация разбирается один раз, запятые заменяются пробелами
+_FMT_PRICE = "{:,} ₽/мес".format
+_COMMA_TO_SPACE = str.maketrans({',': ' '})
+
+@lru_cache(maxsize=256)
+def _format_price(price: int) -> str:
+    """Текст цены; цены в выдаче часто повторяются, поэтому результат кешируется"""
+    return _FMT_PRICE(price).translate(_COMMA_TO_SPACE)
+
 # Импортируем модуль обхода защиты
 try:
     from anti_bot_bypass import bypass_system
@@ -31,74 +71,139 @@ except ImportError:
 class CianParser:
     """Упрощенный парсер объявлений с Cian.ru для интеграции"""
     
+    _data_dir_ready = False  # Директория данных уже создана в этом процессе
+    _EMPTY: Dict = {}  # Общий пустой словарь для отсутствующих вложенных полей объявления
+    OFFER_CACHE_SIZE = 4096  # Сколько обработанных объявлений держать в памяти между опросами
+    BYPASS_CACHE_TTL = 60  # Сколько секунд переиспользовать ответ, полученный через обход защиты
+    
     def __init__(self):
         self.ensure_data_dir()
+        # Настройки безопасности читаются из конфига один раз
+        self._request_timeout = SECURITY_CONFIG['request_timeout']
+        self._rotate_user_agent = SECURITY_CONFIG['rotate_user_agent']
+        self._use_proxy_rotation = SECURITY_CONFIG['use_proxy_rotation'] and bool(PROXY_LIST)
         self.session = requests.Session()
         self._setup_session()
-        self.last_safety_check = None  # Результат последней проверки безопасности
+        # parse_offers_async выполняет parse_offers в разных потоках, поэтому
+        # общие кеши меняются только под этой блокировкой
+        self._cache_lock = threading.Lock()
+        self._seen_cache: Dict[str, Set[int]] = {}  # Виденные объявления по пользователям
+        self._seen_loaded: Set[str] = set()  # Пользователи, для которых БД успешно прочитана
+        self._offer_cache: OrderedDict = OrderedDict()  # LRU обработанных объявлений
+        self._bypass_cache = (0.0, None)  # (время получения, данные) последнего обхода защиты
     
     def _setup_session(self):
         """Настраивает сессию с ротацией прокси и User-Agent"""
         # Настройка прокси
-        if SECURITY_CONFIG['use_proxy_rotation'] and PROXY_LIST:
+        if self._use_proxy_rotation:
             proxy = random.choice(PROXY_LIST)
             self.session.proxies.update({
                 'http': proxy,
                 'https': proxy
             })
-            logger.info(f"Используется прокси: {proxy[:20]}...")
+            logger.info("Используется прокси: %s...", proxy[:20])
         
         # Настройка таймаутов
-        self.session.timeout = SECURITY_CONFIG['request_timeout']
+        self.session.timeout = self._request_timeout
+        
+        # Пул соединений и повторы на уровне urllib3: TCP/TLS переиспользуются между запросами.
+        # Статус 500 не повторяем - на него parse_offers переключается на тестовые данные
+        retry = Retry(
+            total=SECURITY_CONFIG['max_retries'],
+            backoff_factor=1,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        # parse_offers_async выполняет запросы из пула потоков asyncio (до 32 потоков),
+        # поэтому пул соединений к одному хосту рассчитан на столько же параллельных запросов
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, pool_block=False, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # Ротация User-Agent
-        if SECURITY_CONFIG['rotate_user_agent']:
-            user_agent = random.choice(USER_AGENTS)
-            headers = HEADERS.copy()
-            headers['user-agent'] = user_agent
+        if self._rotate_user_agent and _HEADERS_POOL:
+            headers = next(_HEADERS_ITER)
             self.session.headers.update(headers)
-            logger.info(f"Установлен User-Agent: {user_agent[:50]}...")
+            logger.info("Установлен User-Agent: %s...", headers['user-agent'][:50])
         else:
             self.session.headers.update(HEADERS)
     
-    def _check_safety_before_request(self, user_id: str) -> bool:
-        """Проверка безопасного режима перед парсингом"""
+    def _check_safety_before_request(self, user_id: str) -> Tuple[bool, Dict]:
+        """
+        Проверка безопасного режима перед парсингом
+        
+        Результат проверки возвращается вызывающему, а не сохраняется в парсере:
+        экземпляр общий, и параллельные парсинги разных пользователей
+        не должны видеть статус друг друга.
+        """
         if not SAFE_MODE_ENABLED:
-            logger.info(f"⚠️ Безопасный режим отключен - парсинг разрешен для пользователя {user_id}")
-            self.last_safety_check = {'status': 'disabled', 'message': 'Безопасный режим отключен'}
-            return True
+            logger.info("⚠️ Безопасный режим отключен - парсинг разрешен для пользователя %s", user_id)
+            return True, {'status': 'disabled', 'message': 'Безопасный режим отключен'}
         
-        logger.info(f"🛡️ Проверка безопасного режима для пользователя {user_id}")
+        logger.info("🛡️ Проверка безопасного режима для пользователя %s", user_id)
         
-        can_parse, status_info = safe_mode.can_parse(user_id)
+        can_parse, status_info = get_safe_mode().can_parse(user_id)
         
         if not can_parse:
-            logger.warning(f"🚫 Парсинг заблокирован для пользователя {user_id}: {status_info.get('message', 'Неизвестная причина')}")
-            self.last_safety_check = status_info
-            return False
+            logger.warning("🚫 Парсинг заблокирован для пользователя %s: %s", user_id, status_info.get('message', 'Неизвестная причина'))
+            return False, status_info
         
-        logger.info(f"✅ Парсинг разрешен для пользователя {user_id}: {status_info.get('message', 'Проверка пройдена')}")
-        self.last_safety_check = status_info
-        return True
+        logger.info("✅ Парсинг разрешен для пользователя %s: %s", user_id, status_info.get('message', 'Проверка пройдена'))
+        return True, status_info
     
     def ensure_data_dir(self):
-        """Создает директорию для данных если её нет"""
+        """Создает директорию для данных если её нет (один раз на процесс)"""
+        if CianParser._data_dir_ready:
+            return
         os.makedirs(DATA_DIR, exist_ok=True)
+        CianParser._data_dir_ready = True
     
     def load_seen_offers(self, user_id: str = "default") -> Set[int]:
-        """Загружает ID уже виденных объявлений для пользователя из БД"""
+        """
+        Загружает ID уже виденных объявлений для пользователя
+        
+        БД читается до первого успешного чтения, дальше используется кеш,
+        который обновляется в save_seen_offers. Пока чтение не удалось, кеш
+        хранит только ID, сохраненные в этом процессе, и при следующем
+        обращении БД читается снова. Возвращается копия, чтобы изменения
+        до сохранения не попадали в кеш.
+        """
+        with self._cache_lock:
+            if user_id in self._seen_loaded:
+                return set(self._seen_cache.get(user_id, ()))
+        
         try:
-            return db_manager.get_seen_offers(user_id)
+            seen_offers = db_manager.get_seen_offers(user_id, raise_errors=True)
         except Exception as e:
-            logger.error(f"Ошибка загрузки seen_offers из БД: {e}")
-            return set()
+            logger.error("Ошибка загрузки seen_offers из БД: %s", e)
+            with self._cache_lock:
+                return set(self._seen_cache.get(user_id, ()))
+        
+        with self._cache_lock:
+            # Параллельный парсинг мог уже дополнить кеш - объединяем
+            cached = self._seen_cache.setdefault(user_id, set())
+            cached.update(seen_offers)
+            self._seen_loaded.add(user_id)
+            return set(cached)
     
     def save_seen_offers(self, seen_offers: Set[int], user_id: str = "default"):
-        """Сохраняет ID виденных объявлений в БД"""
+        """
+        Добавляет ID виденных объявлений в кеш и в фоне записывает их в БД
+        
+        Запись только дополняет уже сохраненные ID, поэтому достаточно
+        передавать новые объявления текущего парсинга. Кеш обновляется сразу,
+        так что следующий опрос не покажет эти объявления повторно.
+        """
+        if not seen_offers:
+            return
+        
+        with self._cache_lock:
+            self._seen_cache.setdefault(user_id, set()).update(seen_offers)
         try:
-            db_manager.save_seen_offers(user_id, seen_offers)
+            _BG.submit(db_manager.save_seen_offers, user_id, set(seen_offers))
         except Exception as e:
-            logger.error(f"Ошибка сохранения seen_offers в БД: {e}")
+            logger.error("Ошибка сохранения seen_offers в БД: %s", e)
     
     def parse_offers(self, user_id: str = "default", only_new: bool = True, geo_filter: Dict = None) -> Tuple[List[Dict], Dict]:
         """
@@ -115,9 +220,10 @@ class CianParser:
         start_time = time.time()
         
         # Проверяем безопасный режим перед запуском
-        if not self._check_safety_before_request(user_id):
+        can_parse, safety_check = self._check_safety_before_request(user_id)
+        if not can_parse:
             # Возвращаем детальную информацию о блокировке
-            safety_info = self.last_safety_check or {}
+            safety_info = get_safe_mode().format_status(safety_check or {})
             
             error_message = safety_info.get('message', 'Парсинг заблокирован системой безопасности')
             
@@ -135,7 +241,7 @@ class CianParser:
                 'safety_mode': True
             }
             
-            logger.info(f"Парсинг заблокирован для {user_id}: следующий доступен {safety_info.get('next_available', 'неизвестно когда')}")
+            logger.info("Парсинг заблокирован для %s: следующий доступен %s", user_id, safety_info.get('next_available', 'неизвестно когда'))
             return [], blocked_stats
         
         parsing_success = False
@@ -145,30 +251,24 @@ class CianParser:
             # Загружаем уже виденные объявления
             seen_offers = self.load_seen_offers(user_id)
             
-            # Начинаем сессию парсинга в БД
-            session_id = db_manager.start_parsing_session(user_id, 'cian')
-            
-            # Формируем параметры запроса
-            search_params = DEFAULT_SEARCH_PARAMS.copy()
-            
-            logger.info(f"Выполняем запрос к Cian API для пользователя {user_id}")
+            logger.info("Выполняем запрос к Cian API для пользователя %s", user_id)
             
             # ПРОДВИНУТЫЙ РЕЖИМ: Пробуем обход защиты
             if BYPASS_AVAILABLE:
                 logger.info("🛡️ Используем продвинутый обход защиты...")
-                api_data = bypass_system.get_working_data()
+                api_data = self._get_bypass_data()
                 
                 if api_data and 'data' in api_data:
                     logger.info("✅ Данные получены через обход защиты!")
                     raw_offers = api_data.get('data', {}).get('offers', [])
-                    logger.info(f"Получено {len(raw_offers)} объявлений через обход защиты")
+                    logger.info("Получено %d объявлений через обход защиты", len(raw_offers))
                     
                     # Обрабатываем полученные данные
                     processed_offers, new_offers = self._process_api_data(raw_offers, seen_offers, user_id)
                     
                     # Завершаем успешно
-                    self.save_seen_offers(seen_offers, user_id)
-                    db_manager.finish_parsing_session(session_id, len(processed_offers), len(new_offers))
+                    self.save_seen_offers({int(offer.get('id', 0)) for offer in new_offers}, user_id)
+                    _BG.submit(db_manager.record_parsing_session, user_id, start_time, len(processed_offers), len(new_offers), 'cian')
                     
                     offers_to_return = new_offers if only_new else processed_offers
                     search_time = time.time() - start_time
@@ -182,14 +282,14 @@ class CianParser:
                         'bypass_mode': True
                     }
                     
-                    logger.info(f"Парсинг завершен успешно: {len(offers_to_return)} объявлений")
+                    logger.info("Парсинг завершен успешно: %d объявлений", len(offers_to_return))
                     
                     # Записываем успешный парсинг в безопасный режим
-                    safe_mode.log_parsing(user_id, success=True)
+                    get_safe_mode().log_parsing(user_id, success=True)
                     if SAFE_MODE_ENABLED:
-                        logger.info(f"🛡️ Парсинг (обход защиты) записан в безопасный режим для пользователя {user_id}")
+                        logger.info("🛡️ Парсинг (обход защиты) записан в безопасный режим для пользователя %s", user_id)
                     else:
-                        logger.info(f"⚠️ Парсинг (обход защиты) завершен (безопасный режим отключен) для пользователя {user_id}")
+                        logger.info("⚠️ Парсинг (обход защиты) завершен (безопасный режим отключен) для пользователя %s", user_id)
                     
                     return offers_to_return, stats
                 else:
@@ -199,8 +299,9 @@ class CianParser:
             # Выполняем запрос к API
             response = self.session.post(
                 CIAN_API_URL,
-                json=search_params,
-                timeout=SECURITY_CONFIG['request_timeout']
+                data=_SEARCH_BODY,
+                headers=_SEARCH_HEADERS,
+                timeout=self._request_timeout
             )
             
             if response.status_code != 200:
@@ -215,40 +316,19 @@ class CianParser:
                 return [], {"error": error_msg}
             
             # Парсим ответ
-            data = response.json()
+            data = _json_loads(response.content)
             raw_offers = data.get('data', {}).get('offers', [])
             
-            logger.info(f"Получено {len(raw_offers)} объявлений из API")
+            logger.info("Получено %d объявлений из API", len(raw_offers))
             
             # Обрабатываем объявления
-            processed_offers = []
-            new_offers = []
+            processed_offers, new_offers = self._process_api_data(raw_offers, seen_offers, user_id)
             
-            for offer in raw_offers:
-                try:
-                    processed_offer = self._process_offer(offer)
-                    processed_offers.append(processed_offer)
-                    
-                    offer_id = int(processed_offer.get('id', 0))
-                    
-                    # Проверяем, новое ли это объявление
-                    if offer_id not in seen_offers:
-                        new_offers.append(processed_offer)
-                        seen_offers.add(offer_id)
-                        
-                        # Сохраняем в БД
-                        db_data = self._prepare_for_databd(processed_offer)
-                        db_manager.save_listing(db_data)
-                        
-                except Exception as e:
-                    logger.error(f"Ошибка обработки объявления: {e}")
-                    continue
-            
-            # Сохраняем обновленные seen_offers
-            self.save_seen_offers(seen_offers, user_id)
-            
-            # Завершаем сессию парсинга
-            db_manager.finish_parsing_session(session_id, len(processed_offers), len(new_offers))
+            # Сохраняем только новые seen_offers
+            self.save_seen_offers({int(offer.get('id', 0)) for offer in new_offers}, user_id)
+            
+            # Записываем сессию парсинга
+            _BG.submit(db_manager.record_parsing_session, user_id, start_time, len(processed_offers), len(new_offers), 'cian')
             
             # Определяем какие объявления возвращать
             offers_to_return = new_offers if only_new else processed_offers
@@ -263,68 +343,121 @@ class CianParser:
                 'timestamp': datetime.now().strftime('%H:%M:%S')
             }
             
-            logger.info(f"Парсинг завершен: {len(offers_to_return)} объявлений для пользователя {user_id}")
+            logger.info("Парсинг завершен: %d объявлений для пользователя %s", len(offers_to_return), user_id)
             
             # Записываем успешный парсинг в безопасный режим
             parsing_success = True
-            safe_mode.log_parsing(user_id, success=True)
+            get_safe_mode().log_parsing(user_id, success=True)
             if SAFE_MODE_ENABLED:
-                logger.info(f"🛡️ Парсинг записан в безопасный режим для пользователя {user_id}")
+                logger.info("🛡️ Парсинг записан в безопасный режим для пользователя %s", user_id)
             else:
-                logger.info(f"⚠️ Парсинг завершен (безопасный режим отключен) для пользователя {user_id}")
+                logger.info("⚠️ Парсинг завершен (безопасный режим отключен) для пользователя %s", user_id)
             
             return offers_to_return, stats
             
         except Exception as e:
-            logger.error(f"Ошибка при парсинге для пользователя {user_id}: {e}")
+            logger.error("Ошибка при парсинге для пользователя %s: %s", user_id, e)
             return [], {"error": str(e)}
     
+    def _get_bypass_data(self) -> Dict:
+        """
+        Получает данные через обход защиты
+        
+        Обход перебирает несколько адресов и наборов параметров, поэтому удачный
+        ответ переиспользуется BYPASS_CACHE_TTL секунд для всех пользователей
+        (параметры поиска общие). Неудачная попытка сбрасывает кеш.
+        """
+        cached_at, cached_data = self._bypass_cache
+        if cached_data is not None and time.time() - cached_at < self.BYPASS_CACHE_TTL:
+            logger.info("♻️ Используем недавний ответ обхода защиты")
+            return cached_data
+        
+        api_data = bypass_system.get_working_data()
+        if api_data and 'data' in api_data:
+            self._bypass_cache = (time.time(), api_data)
+        else:
+            self._bypass_cache = (0.0, None)
+        return api_data
+    
+    async def parse_offers_async(self, user_id: str = "default", only_new: bool = True, geo_filter: Dict = None) -> Tuple[List[Dict], Dict]:
+        """
+        Асинхронная обертка над parse_offers для обработчиков бота
+        
+        Блокирующий запрос выполняется в пуле потоков, поэтому цикл событий
+        не простаивает и парсинг для разных пользователей идет параллельно.
+        """
+        return await asyncio.to_thread(self.parse_offers, user_id, only_new, geo_filter)
+    
+    @staticmethod
+    def _copy_processed(processed_offer: Dict) -> Dict:
+        """Копия обработанного объявления из кеша (список телефонов тоже копируется)"""
+        copy = dict(processed_offer)
+        copy['phones'] = list(copy['phones'])
+        return copy
+    
     def _process_offer(self, offer: Dict) -> Dict:
-        """Обрабатывает одно объявление"""
+        """
+        Обрабатывает одно объявление
+        
+        Большинство объявлений повторяется от опроса к опросу, поэтому результат
+        кешируется по (ID, дата редактирования, цена): ключ из трех полей дешевле
+        самой обработки. Объявления без даты редактирования и добавления не
+        кешируются. Вызывающему отдается копия, чтобы его изменения не портили
+        запись в кеше.
+        """
         try:
-            # Базовая информация
-            offer_id = offer.get('id', 0)
-            price = offer.get('bargainTerms', {}).get('priceRur', 0)
+            # Методы и константы, нужные на каждое поле, связываем с локальными именами
+            get = offer.get
+            empty = self._EMPTY
+            
+            # Базовая информация; ID приводится к int здесь, под общим try -
+            # нечисловой ID дает объявление-заглушку с ID 0, а не ошибку всего парсинга
+            offer_id = int(get('id') or 0)
+            price = (get('bargainTerms') or empty).get('priceRur', 0)
+            
+            # Любая правка объявления меняет editDate, поэтому полные данные не сравниваются
+            version = get('editDate') or get('addedTimestamp')
+            cache_key = (offer_id, version, price) if version is not None else None
+            if cache_key is not None:
+                with self._cache_lock:
+                    cached = self._offer_cache.get(cache_key)
+                    if cached is not None:
+                        self._offer_cache.move_to_end(cache_key)
+                if cached is not None:
+                    return self._copy_processed(cached)
             
             # Формируем текст цены
             if price > 0:
-                price_text = f"{price:,} ₽/мес".replace(',', ' ')
+                price_text = _format_price(price)
             else:
                 price_text = "Цена не указана"
             
             # Площадь
-            area_data = offer.get('totalArea', {})
-            area = f"{area_data.get('value', 0)} м²" if area_data.get('value') else "Площадь не указана"
+            area_value = (get('totalArea') or empty).get('value')
+            area = f"{area_value} м²" if area_value else "Площадь не указана"
             
             # Адрес
-            address_parts = []
-            geo = offer.get('geo', {})
-            if geo.get('userInput'):
-                address_parts.append(geo['userInput'])
-            address = ', '.join(address_parts) if address_parts else "Адрес не указан"
+            address = (get('geo') or empty).get('userInput') or "Адрес не указан"
             
             # URL
-            url = f"https://perm.cian.ru/rent/commercial/{offer_id}/"
+            url = _URL_TMPL % offer_id
             
             # Этаж
-            floor_number = offer.get('floorNumber', 0)
-            floors_count = offer.get('building', {}).get('floorsCount', 0)
-            floor_info = f"{floor_number}/{floors_count}" if floor_number and floors_count else "Не указан"
+            floor_number = get('floorNumber', 0)
+            floors_count = (get('building') or empty).get('floorsCount', 0)
+            floor_info = "%s/%s" % (floor_number, floors_count) if floor_number and floors_count else "Не указан"
             
             # Телефоны
-            phones = []
-            for phone in offer.get('phones', []):
-                if phone.get('number'):
-                    phones.append(phone['number'])
+            phones = [phone['number'] for phone in get('phones') or () if phone.get('number')]
             
             # Тип помещения
-            commercial_type = offer.get('category', {})
+            commercial_type = get('category', empty)
             types = commercial_type.get('name', 'Свободное назначение') if commercial_type else 'Свободное назначение'
             
             # Описание
-            description = offer.get('description', '')
+            description = get('description', '')
             
-            return {
+            processed_offer = {
                 'id': offer_id,
                 'price_text': price_text,
                 'price_per_month': price,
@@ -333,15 +466,25 @@ class CianParser:
                 'url': url,
                 'floor_info': floor_info,
                 'phones': phones,
+                'phones_str': ', '.join(phones),
                 'types': types,
                 'description': description,
                 'added_time': 'Недавно'  # Упрощено для базовой версии
             }
             
+            if cache_key is None:
+                return processed_offer
+            
+            with self._cache_lock:
+                self._offer_cache[cache_key] = processed_offer
+                while len(self._offer_cache) > self.OFFER_CACHE_SIZE:
+                    self._offer_cache.popitem(last=False)
+            return self._copy_processed(processed_offer)
+            
         except Exception as e:
-            logger.error(f"Ошибка обработки объявления {offer.get('id', 'unknown')}: {e}")
+            logger.error("Ошибка обработки объявления %s: %s", offer.get('id', 'unknown'), e)
             return {
-                'id': offer.get('id', 0),
+                'id': 0,
                 'price_text': 'Ошибка загрузки',
                 'price_per_month': 0,
                 'area': 'Не указана',
@@ -349,6 +492,7 @@ class CianParser:
                 'url': '',
                 'floor_info': 'Не указан',
                 'phones': [],
+                'phones_str': '',
                 'types': 'Не указан',
                 'description': f'Ошибка обработки: {e}',
                 'added_time': 'Ошибка'
@@ -368,13 +512,13 @@ class CianParser:
                 'address': processed_offer.get('address', ''),
                 'lat': '',  # Упрощено для базовой версии
                 'lng': '',  # Упрощено для базовой версии
-                'seller': ', '.join(processed_offer.get('phones', [])),
+                'seller': processed_offer.get('phones_str', ''),
                 'photos': [],  # Упрощено для базовой версии
                 'status': 'open',
                 'visible': 1
             }
         except Exception as e:
-            logger.error(f"Ошибка подготовки данных для dataBD: {e}")
+            logger.error("Ошибка подготовки данных для dataBD: %s", e)
             return {
                 'id': str(processed_offer.get('id', 'error')),
                 'source': 'cian',
@@ -406,6 +550,7 @@ class CianParser:
                 'url': 'https://perm.cian.ru/rent/commercial/1001/',
                 'floor_info': '3/9',
                 'phones': ['+7(342)123-45-67'],
+                'phones_str': '+7(342)123-45-67',
                 'types': 'Офис',
                 'description': 'Демонстрационное объявление - API Cian.ru временно недоступен',
                 'added_time': 'Сегодня'
@@ -419,19 +564,18 @@ class CianParser:
                 'url': 'https://perm.cian.ru/rent/commercial/1002/',
                 'floor_info': '1/5',
                 'phones': ['+7(342)987-65-43'],
+                'phones_str': '+7(342)987-65-43',
                 'types': 'Торговое помещение',
                 'description': 'Демонстрационное объявление #2 - API Cian.ru временно недоступен',
                 'added_time': 'Вчера'
             }
         ]
         
-        # Сохраняем демо данные в БД
-        for offer in demo_offers:
-            try:
-                db_data = self._prepare_for_databd(offer)
-                db_manager.save_listing(db_data)
-            except Exception as e:
-                logger.error(f"Ошибка сохранения демо данных: {e}")
+        # Сохраняем демо данные в БД одной транзакцией
+        try:
+            db_manager.save_listings_bulk([self._prepare_for_databd(offer) for offer in demo_offers])
+        except Exception as e:
+            logger.error("Ошибка сохранения демо данных: %s", e)
         
         # Формируем статистику
         stats = {
@@ -445,41 +589,39 @@ class CianParser:
         
         offers_to_return = demo_offers if only_new else demo_offers
         
-        logger.info(f"Возвращаем {len(offers_to_return)} демонстрационных объявлений")
+        logger.info("Возвращаем %d демонстрационных объявлений", len(offers_to_return))
         
         # Записываем демо-парсинг в безопасный режим (как успешный)
-        safe_mode.log_parsing(user_id, success=True)
+        get_safe_mode().log_parsing(user_id, success=True)
         if SAFE_MODE_ENABLED:
-            logger.info(f"🛡️ Демо-парсинг записан в безопасный режим для пользователя {user_id}")
+            logger.info("🛡️ Демо-парсинг записан в безопасный режим для пользователя %s", user_id)
         else:
-            logger.info(f"⚠️ Демо-парсинг завершен (безопасный режим отключен) для пользователя {user_id}")
+            logger.info("⚠️ Демо-парсинг завершен (безопасный режим отключен) для пользователя %s", user_id)
         
         return offers_to_return, stats
     
     def _process_api_data(self, raw_offers: List[Dict], seen_offers: Set[int], user_id: str) -> Tuple[List[Dict], List[Dict]]:
         """Обрабатывает данные полученные от API"""
         processed_offers = []
-        new_offers = []
+        offers_by_id = {}  # Первое вхождение каждого ID в порядке выдачи
         
+        # _process_offer и _prepare_for_databd сами перехватывают ошибки,
+        # поэтому циклы обходятся без try/except на каждой итерации
         for offer in raw_offers:
-            try:
-                processed_offer = self._process_offer(offer)
-                processed_offers.append(processed_offer)
-                
-                offer_id = int(processed_offer.get('id', 0))
-                
-                # Проверяем, новое ли это объявление
-                if offer_id not in seen_offers:
-                    new_offers.append(processed_offer)
-                    seen_offers.add(offer_id)
-                    
-                    # Сохраняем в БД
-                    db_data = self._prepare_for_databd(processed_offer)
-                    db_manager.save_listing(db_data)
-                    
-            except Exception as e:
-                logger.error(f"Ошибка обработки объявления: {e}")
+            processed_offer = self._process_offer(offer)
+            offer_id = processed_offer['id']
+            if not offer_id:  # Объявления без ID и заглушки ошибок пропускаем
                 continue
+            processed_offers.append(processed_offer)
+            offers_by_id.setdefault(offer_id, processed_offer)
+        
+        # Новые объявления - разность множеств вместо проверки каждого ID в цикле
+        new_ids = offers_by_id.keys() - seen_offers
+        new_offers = [offer for offer_id, offer in offers_by_id.items() if offer_id in new_ids]
+        seen_offers.update(new_ids)
+        
+        # Сохраняем новые объявления в БД одной транзакцией
+        db_manager.save_listings_bulk([self._prepare_for_databd(offer) for offer in new_offers])
         
         return processed_offers, new_offers
     
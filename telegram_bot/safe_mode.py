@@ -4,55 +4,250 @@
 Ограничивает парсинг одним разом в сутки для предотвращения блокировки
 """
 
+import asyncio
+import atexit
 import sqlite3
 import json
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Tuple, Optional
 import logging
 from config import SAFE_MODE_ENABLED
 
 logger = logging.getLogger(__name__)
 
+# SQL горячих запросов вынесен в константы: sqlite3 кэширует подготовленные
+# выражения по тексту запроса, поэтому повторные вызовы берут их из кэша
+# соединения без повторного разбора
+_SELECT_USER_STATE_SQL = """
+    SELECT last_parsing_time, parsing_count_today, last_reset_date, total_parsing_count,
+           created_at
+    FROM safety_log 
+    WHERE user_id = ?
+"""
+
+_UPSERT_PARSING_SQL = """
+    INSERT INTO safety_log 
+    (user_id, last_parsing_time, parsing_count_today, total_parsing_count, last_reset_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        last_parsing_time = excluded.last_parsing_time,
+        parsing_count_today = CASE
+            WHEN last_reset_date IS excluded.last_reset_date
+            THEN COALESCE(parsing_count_today, 0) + excluded.parsing_count_today
+            ELSE excluded.parsing_count_today
+        END,
+        total_parsing_count = COALESCE(total_parsing_count, 0) + excluded.total_parsing_count,
+        last_reset_date = excluded.last_reset_date,
+        updated_at = excluded.last_parsing_time
+"""
+
+@lru_cache(maxsize=1)
+def _date_key(ts: int) -> int:
+    """
+    Номер локального дня с начала эпохи: сдвиг на смещение часового пояса
+    и целочисленное деление, без календарной арифметики и strftime
+    
+    Ключ кэша - целая секунда, поэтому при серии вызовов подряд смещение
+    пояса запрашивается не чаще раза в секунду.
+    """
+    return (ts + time.localtime(ts).tm_gmtoff) // 86400
+
+def _format_ts(ts: int) -> str:
+    """Человекочитаемое представление unix-времени для сообщений пользователю"""
+    return datetime.fromtimestamp(ts).strftime('%d.%m.%Y в %H:%M')
+
 class SafeMode:
     """Класс для управления безопасным режимом парсинга"""
     
+    # Пути баз, для которых таблица уже создана/перенесена в этом процессе:
+    # повторные экземпляры не выполняют DDL заново
+    _initialized_paths: set = set()
+    
+    # Записи log_parsing копятся в очереди и пишутся одной транзакцией
+    # раз в WRITE_FLUSH_INTERVAL секунд или при накоплении WRITE_BATCH_SIZE
+    WRITE_FLUSH_INTERVAL = 0.2
+    WRITE_BATCH_SIZE = 32
+    
     def __init__(self, db_path: str = "dataBD/real_estate_data.db"):
         self.db_path = db_path
         self.safety_interval_hours = 24  # 24 часа между парсингами
         self.enabled = SAFE_MODE_ENABLED  # Управляется флагом в config.py
+        # Одно долгоживущее соединение на экземпляр: кэш страниц SQLite
+        # остается прогретым между вызовами can_parse/log_parsing
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._flush_event = threading.Event()
+        self._closed = threading.Event()
+        self._writer: Optional[threading.Thread] = None
         if self.enabled:
-            self.init_safety_table()
+            if db_path not in SafeMode._initialized_paths:
+                self.init_safety_table()
+                SafeMode._initialized_paths.add(db_path)
+            # Поток и хук atexit снимаются в close()
+            self._writer = threading.Thread(target=self._writer_loop, name='safe-mode-writer', daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
             logger.info("🛡️ Безопасный режим включен")
         else:
             logger.info("⚠️ Безопасный режим отключен")
     
+    def _get_conn(self) -> sqlite3.Connection:
+        """Возвращает кэшированное соединение, открывая его при первом обращении"""
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=128
+            )
+            # Журнал безопасности - некритичная статистика, поэтому WAL и
+            # synchronous=NORMAL: без fsync на каждый log_parsing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-64000")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._conn = conn
+        return self._conn
+    
+    def _get_cursor(self) -> sqlite3.Cursor:
+        """Возвращает долгоживущий курсор кэшированного соединения (вызывать под self._lock)"""
+        if self._cursor is None:
+            self._cursor = self._get_conn().cursor()
+        return self._cursor
+    
+    def _flush_pending(self, cursor: sqlite3.Cursor):
+        """Записывает накопленные log_parsing одной транзакцией (вызывать под self._lock)"""
+        if not self._pending:
+            return
+        
+        rows = []
+        while self._pending:
+            rows.append(self._pending.popleft())
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany(_UPSERT_PARSING_SQL, rows)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    
+    def _writer_loop(self):
+        """Фоновый поток: периодически сбрасывает очередь log_parsing в базу до close()"""
+        while not self._closed.is_set():
+            self._flush_event.wait(self.WRITE_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            if self._closed.is_set() or not self._pending:
+                continue
+            try:
+                with self._lock:
+                    self._flush_pending(self._get_cursor())
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи журнала безопасности: {e}")
+    
+    def close(self):
+        """
+        Останавливает фоновый поток, дописывает очередь log_parsing
+        и закрывает кэшированное соединение
+        
+        Снимает хук atexit, поэтому закрытый экземпляр больше ничем не удерживается.
+        Повторный вызов безопасен.
+        """
+        self._closed.set()
+        self._flush_event.set()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+        self._writer = None
+        atexit.unregister(self.close)
+        
+        with self._lock:
+            if self._pending:
+                try:
+                    self._flush_pending(self._get_cursor())
+                except Exception as e:
+                    logger.error(f"Ошибка записи очереди журнала безопасности: {e}")
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._cursor = None
+    
     def init_safety_table(self):
         """Создает таблицу для отслеживания безопасного режима"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Создаем таблицу для отслеживания последних парсингов
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS safety_log (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id TEXT NOT NULL,
-                        last_parsing_time TIMESTAMP,
-                        parsing_count_today INTEGER DEFAULT 0,
-                        total_parsing_count INTEGER DEFAULT 0,
-                        last_reset_date TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Создаем индекс для быстрого поиска по пользователю
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_safety_user_id 
-                    ON safety_log(user_id)
-                """)
+            with self._lock:
+                cursor = self._get_cursor()
+                
+                # Таблицы старого формата (суррогатный id + индекс по user_id)
+                # перестраиваем: переименовываем и переносим данные ниже
+                cursor.execute("PRAGMA table_info(safety_log)")
+                legacy = any(row[1] == 'id' for row in cursor.fetchall())
+                
+                cursor.execute("BEGIN")
+                try:
+                    if legacy:
+                        cursor.execute("ALTER TABLE safety_log RENAME TO safety_log_legacy")
+                    
+                    # Одна запись на пользователя: user_id - первичный ключ
+                    # WITHOUT ROWID-таблицы, поиск по нему - один проход по B-дереву
+                    # без отдельного индекса и обращения к строке по rowid
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS safety_log (
+                            user_id TEXT PRIMARY KEY,
+                            last_parsing_time INTEGER,
+                            parsing_count_today INTEGER DEFAULT 0,
+                            total_parsing_count INTEGER DEFAULT 0,
+                            last_reset_date INTEGER,
+                            created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                            updated_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+                        ) WITHOUT ROWID
+                    """)
+                    
+                    if legacy:
+                        # Время переводим в unix-секунды (ISO-строки записывались
+                        # в локальном времени), дату сброса - в yyyymmdd (ниже - в номер дня).
+                        # При дубликатах побеждает последняя запись
+                        cursor.execute("""
+                            INSERT OR REPLACE INTO safety_log 
+                            (user_id, last_parsing_time, parsing_count_today, total_parsing_count,
+                             last_reset_date, created_at, updated_at)
+                            SELECT user_id,
+                                   CASE WHEN typeof(last_parsing_time) = 'text'
+                                        THEN CAST(strftime('%s', last_parsing_time, 'utc') AS INTEGER)
+                                        ELSE last_parsing_time END,
+                                   parsing_count_today,
+                                   total_parsing_count,
+                                   CAST(REPLACE(last_reset_date, '-', '') AS INTEGER),
+                                   CAST(strftime('%s', created_at) AS INTEGER),
+                                   CAST(strftime('%s', 'now') AS INTEGER)
+                            FROM safety_log_legacy
+                            ORDER BY id
+                        """)
+                        cursor.execute("DROP TABLE safety_log_legacy")
+                        logger.info("Таблица безопасного режима перенесена в новый формат")
+                    
+                    # Даты сброса в старом формате yyyymmdd переводим в номер
+                    # дня с начала эпохи (2440587.5 - юлианский день 1970-01-01)
+                    cursor.execute("""
+                        UPDATE safety_log 
+                        SET last_reset_date = CAST(julianday(printf('%04d-%02d-%02d',
+                            last_reset_date / 10000, last_reset_date / 100 % 100,
+                            last_reset_date % 100)) - 2440587.5 AS INTEGER)
+                        WHERE last_reset_date > 10000000
+                    """)
+                    
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
                 
-                conn.commit()
                 logger.info("Таблица безопасного режима инициализирована")
                 
         except Exception as e:
@@ -80,70 +275,16 @@ class SafeMode:
             }
         
         try:
-            current_time = datetime.now()
-            current_date = current_time.strftime('%Y-%m-%d')
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._get_cursor()
+                self._flush_pending(cursor)
                 
                 # Получаем данные о последнем парсинге пользователя
-                cursor.execute("""
-                    SELECT last_parsing_time, parsing_count_today, last_reset_date, total_parsing_count
-                    FROM safety_log 
-                    WHERE user_id = ?
-                """, (user_id,))
-                
+                cursor.execute(_SELECT_USER_STATE_SQL, (user_id,))
                 result = cursor.fetchone()
-                
-                if not result:
-                    # Первый парсинг пользователя
-                    return True, {
-                        'status': 'first_time',
-                        'message': '✅ Первый запуск парсинга разрешен',
-                        'next_available': 'Через 24 часа после этого парсинга',
-                        'total_today': 0,
-                        'total_all_time': 0
-                    }
-                
-                last_parsing_str, count_today, last_reset_date, total_count = result
-                
-                # Сброс счетчика если сменился день
-                if last_reset_date != current_date:
-                    count_today = 0
-                
-                # Если уже парсили сегодня
-                if count_today > 0:
-                    last_parsing = datetime.fromisoformat(last_parsing_str)
-                    time_since_last = current_time - last_parsing
-                    time_left = timedelta(hours=self.safety_interval_hours) - time_since_last
-                    
-                    if time_left.total_seconds() > 0:
-                        # Парсинг заблокирован
-                        hours_left = int(time_left.total_seconds() // 3600)
-                        minutes_left = int((time_left.total_seconds() % 3600) // 60)
-                        
-                        next_available_time = last_parsing + timedelta(hours=self.safety_interval_hours)
-                        
-                        return False, {
-                            'status': 'blocked',
-                            'message': f'🚫 Парсинг заблокирован безопасным режимом',
-                            'hours_left': hours_left,
-                            'minutes_left': minutes_left,
-                            'next_available': next_available_time.strftime('%d.%m.%Y в %H:%M'),
-                            'last_parsing': last_parsing.strftime('%d.%m.%Y в %H:%M'),
-                            'total_today': count_today,
-                            'total_all_time': total_count or 0
-                        }
-                
-                # Парсинг разрешен
-                return True, {
-                    'status': 'allowed',
-                    'message': '✅ Парсинг разрешен безопасным режимом',
-                    'last_parsing': last_parsing_str if last_parsing_str else 'Никогда',
-                    'total_today': count_today,
-                    'total_all_time': total_count or 0
-                }
-                
+            
+            return self._evaluate(result, int(time.time()))
+            
         except Exception as e:
             logger.error(f"Ошибка проверки безопасного режима для {user_id}: {e}")
             # В случае ошибки разрешаем парсинг
@@ -153,6 +294,97 @@ class SafeMode:
                 'error': str(e)
             }
     
+    async def can_parse_async(self, user_id: str) -> Tuple[bool, Dict]:
+        """
+        Асинхронная обертка над can_parse для обработчиков бота
+        
+        Запрос к SQLite выполняется в пуле потоков. Все обращения идут через
+        одно соединение под self._lock, поэтому конкурентных писателей и
+        SQLITE_BUSY не возникает.
+        """
+        return await asyncio.to_thread(self.can_parse, user_id)
+    
+    def _evaluate(self, result: Optional[Tuple], now_ts: int) -> Tuple[bool, Dict]:
+        """
+        Решает, разрешен ли парсинг, по уже прочитанной строке safety_log
+        
+        Args:
+            result: Строка из _SELECT_USER_STATE_SQL или None для нового пользователя
+            now_ts: Текущее unix-время
+            
+        Returns:
+            Tuple[bool, Dict]: (разрешен ли парсинг, информация о состоянии)
+        """
+        if not result:
+            # Первый парсинг пользователя
+            return True, {
+                'status': 'first_time',
+                'message': '✅ Первый запуск парсинга разрешен',
+                'next_available': 'Через 24 часа после этого парсинга',
+                'total_today': 0,
+                'total_all_time': 0
+            }
+        
+        last_parsing_ts, count_today, last_reset_date, total_count = result[:4]
+        
+        # Сброс счетчика если сменился день
+        if last_reset_date != _date_key(now_ts):
+            count_today = 0
+        
+        # Если уже парсили сегодня
+        if count_today > 0 and last_parsing_ts:
+            interval = self.safety_interval_hours * 3600
+            seconds_left = interval - (now_ts - last_parsing_ts)
+            
+            if seconds_left > 0:
+                # Парсинг заблокирован. Даты отдаем как unix-время,
+                # строки для пользователя строит format_status()
+                hours_left, rem = divmod(seconds_left, 3600)
+                minutes_left = rem // 60
+                
+                return False, {
+                    'status': 'blocked',
+                    'message': f'🚫 Парсинг заблокирован безопасным режимом',
+                    'hours_left': hours_left,
+                    'minutes_left': minutes_left,
+                    'next_available_ts': last_parsing_ts + interval,
+                    'last_parsing_ts': last_parsing_ts,
+                    'total_today': count_today,
+                    'total_all_time': total_count or 0
+                }
+        
+        # Парсинг разрешен
+        return True, {
+            'status': 'allowed',
+            'message': '✅ Парсинг разрешен безопасным режимом',
+            'last_parsing_ts': last_parsing_ts,
+            'total_today': count_today,
+            'total_all_time': total_count or 0
+        }
+    
+    def format_status(self, info: Dict) -> Dict:
+        """
+        Дополняет результат can_parse человекочитаемыми датами
+        
+        Форматирование отложено до момента показа пользователю, поэтому
+        can_parse возвращает только unix-время (next_available_ts, last_parsing_ts).
+        
+        Args:
+            info: Словарь состояния из can_parse (дополняется на месте)
+            
+        Returns:
+            Dict: Тот же словарь с ключами next_available и last_parsing
+        """
+        next_ts = info.get('next_available_ts')
+        if next_ts is not None and 'next_available' not in info:
+            info['next_available'] = _format_ts(next_ts)
+        
+        if 'last_parsing_ts' in info and 'last_parsing' not in info:
+            last_ts = info['last_parsing_ts']
+            info['last_parsing'] = _format_ts(last_ts) if last_ts else 'Никогда'
+        
+        return info
+    
     def log_parsing(self, user_id: str, success: bool = True) -> bool:
         """
         Записывает информацию о выполненном парсинге
@@ -170,75 +402,35 @@ class SafeMode:
             return True
         
         try:
-            current_time = datetime.now()
-            current_date = current_time.strftime('%Y-%m-%d')
+            now_ts = int(time.time())
+            
+            # Запись только ставится в очередь: фоновый поток пишет пачку
+            # одним UPSERT-ом в транзакции. При смене дня счетчик за сегодня
+            # начинается заново. Чтения сначала дописывают очередь
+            increment = 1 if success else 0
+            self._pending.append((user_id, now_ts, increment, increment, _date_key(now_ts)))
+            if self._closed.is_set():
+                # Фоновый поток остановлен - пишем сразу
+                with self._lock:
+                    self._flush_pending(self._get_cursor())
+            elif len(self._pending) >= self.WRITE_BATCH_SIZE:
+                self._flush_event.set()
+            
+            if success:
+                logger.info(f"Записан успешный парсинг для пользователя {user_id}")
+            else:
+                logger.info(f"Записан неуспешный парсинг для пользователя {user_id}")
+            
+            return True
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Проверяем, есть ли запись для пользователя
-                cursor.execute("""
-                    SELECT id, parsing_count_today, total_parsing_count, last_reset_date
-                    FROM safety_log 
-                    WHERE user_id = ?
-                """, (user_id,))
-                
-                result = cursor.fetchone()
-                
-                if result:
-                    # Обновляем существующую запись
-                    record_id, count_today, total_count, last_reset_date = result
-                    
-                    # Сброс счетчика если сменился день
-                    if last_reset_date != current_date:
-                        count_today = 0
-                    
-                    new_count_today = count_today + 1 if success else count_today
-                    new_total_count = (total_count or 0) + 1 if success else (total_count or 0)
-                    
-                    cursor.execute("""
-                        UPDATE safety_log 
-                        SET last_parsing_time = ?,
-                            parsing_count_today = ?,
-                            total_parsing_count = ?,
-                            last_reset_date = ?,
-                            updated_at = ?
-                        WHERE id = ?
-                    """, (
-                        current_time.isoformat(),
-                        new_count_today,
-                        new_total_count,
-                        current_date,
-                        current_time.isoformat(),
-                        record_id
-                    ))
-                else:
-                    # Создаем новую запись
-                    cursor.execute("""
-                        INSERT INTO safety_log 
-                        (user_id, last_parsing_time, parsing_count_today, total_parsing_count, last_reset_date)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        user_id,
-                        current_time.isoformat(),
-                        1 if success else 0,
-                        1 if success else 0,
-                        current_date
-                    ))
-                
-                conn.commit()
-                
-                if success:
-                    logger.info(f"Записан успешный парсинг для пользователя {user_id}")
-                else:
-                    logger.info(f"Записан неуспешный парсинг для пользователя {user_id}")
-                
-                return True
-                
         except Exception as e:
             logger.error(f"Ошибка записи парсинга для {user_id}: {e}")
             return False
     
+    async def log_parsing_async(self, user_id: str, success: bool = True) -> bool:
+        """Асинхронная обертка над log_parsing (запись выполняется в пуле потоков)"""
+        return await asyncio.to_thread(self.log_parsing, user_id, success)
+    
     def get_user_safety_stats(self, user_id: str) -> Dict:
         """
         Получает статистику безопасного режима для пользователя
@@ -265,15 +457,11 @@ class SafeMode:
             }
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._get_cursor()
+                self._flush_pending(cursor)
                 
-                cursor.execute("""
-                    SELECT last_parsing_time, parsing_count_today, total_parsing_count, 
-                           last_reset_date, created_at
-                    FROM safety_log 
-                    WHERE user_id = ?
-                """, (user_id,))
+                cursor.execute(_SELECT_USER_STATE_SQL, (user_id,))
                 
                 result = cursor.fetchone()
                 
@@ -287,23 +475,24 @@ class SafeMode:
                         'status': 'ready'
                     }
                 
-                last_parsing_str, today_count, total_count, last_reset, created_at = result
-                
-                # Проверяем текущий статус
-                can_parse, status_info = self.can_parse(user_id)
-                
-                return {
-                    'user_id': user_id,
-                    'first_parsing': created_at,
-                    'last_parsing': last_parsing_str,
-                    'today_count': today_count or 0,
-                    'total_count': total_count or 0,
-                    'can_parse_now': can_parse,
-                    'status': status_info.get('status', 'unknown'),
-                    'next_available': status_info.get('next_available', 'Доступно сейчас'),
-                    'safety_interval': f"{self.safety_interval_hours} часов"
-                }
-                
+                last_parsing_ts, today_count, last_reset, total_count, created_at = result
+            
+            # Статус считаем по той же строке, без повторного запроса в can_parse
+            can_parse, status_info = self._evaluate(result, int(time.time()))
+            self.format_status(status_info)
+            
+            return {
+                'user_id': user_id,
+                'first_parsing': _format_ts(created_at) if created_at else 'Неизвестно',
+                'last_parsing': _format_ts(last_parsing_ts) if last_parsing_ts else 'Никогда',
+                'today_count': today_count or 0,
+                'total_count': total_count or 0,
+                'can_parse_now': can_parse,
+                'status': status_info.get('status', 'unknown'),
+                'next_available': status_info.get('next_available', 'Доступно сейчас'),
+                'safety_interval': f"{self.safety_interval_hours} часов"
+            }
+            
         except Exception as e:
             logger.error(f"Ошибка получения статистики безопасности для {user_id}: {e}")
             return {
@@ -312,6 +501,10 @@ class SafeMode:
                 'status': 'error'
             }
     
+    async def get_user_safety_stats_async(self, user_id: str) -> Dict:
+        """Асинхронная обертка над get_user_safety_stats (чтение выполняется в пуле потоков)"""
+        return await asyncio.to_thread(self.get_user_safety_stats, user_id)
+    
     def get_global_safety_stats(self) -> Dict:
         """
         Получает глобальную статистику безопасного режима
@@ -331,45 +524,33 @@ class SafeMode:
             }
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Общее количество пользователей
-                cursor.execute("SELECT COUNT(DISTINCT user_id) FROM safety_log")
-                total_users = cursor.fetchone()[0] or 0
-                
-                # Общее количество парсингов
-                cursor.execute("SELECT SUM(total_parsing_count) FROM safety_log")
-                total_parsings = cursor.fetchone()[0] or 0
-                
-                # Парсинги сегодня
-                current_date = datetime.now().strftime('%Y-%m-%d')
+            with self._lock:
+                cursor = self._get_cursor()
+                self._flush_pending(cursor)
+                
+                # Вся статистика одним запросом. user_id - первичный ключ,
+                # поэтому COUNT(*) равен числу пользователей. Голый столбец
+                # user_id рядом с единственным MAX() SQLite берет из строки
+                # с максимальным last_parsing_time
+                current_date = _date_key(int(time.time()))
                 cursor.execute("""
-                    SELECT SUM(parsing_count_today) 
-                    FROM safety_log 
-                    WHERE last_reset_date = ?
+                    SELECT COUNT(*),
+                           SUM(total_parsing_count),
+                           SUM(CASE WHEN last_reset_date = ? THEN parsing_count_today ELSE 0 END),
+                           MAX(last_parsing_time),
+                           user_id
+                    FROM safety_log
                 """, (current_date,))
-                today_parsings = cursor.fetchone()[0] or 0
-                
-                # Последний парсинг
-                cursor.execute("""
-                    SELECT user_id, last_parsing_time 
-                    FROM safety_log 
-                    WHERE last_parsing_time IS NOT NULL
-                    ORDER BY last_parsing_time DESC 
-                    LIMIT 1
-                """)
-                last_parsing_result = cursor.fetchone()
+                total_users, total_parsings, today_parsings, last_time, last_user = cursor.fetchone()
                 
                 last_parsing_info = "Никогда"
-                if last_parsing_result:
-                    last_user, last_time = last_parsing_result
-                    last_parsing_info = f"Пользователь {last_user} в {last_time}"
+                if last_time is not None:
+                    last_parsing_info = f"Пользователь {last_user} в {_format_ts(last_time)}"
                 
                 return {
-                    'total_users': total_users,
-                    'total_parsings': total_parsings,
-                    'today_parsings': today_parsings,
+                    'total_users': total_users or 0,
+                    'total_parsings': total_parsings or 0,
+                    'today_parsings': today_parsings or 0,
                     'last_parsing': last_parsing_info,
                     'safety_interval': f"{self.safety_interval_hours} часов",
                     'system_status': '🛡️ Безопасный режим активен'
@@ -393,8 +574,9 @@ class SafeMode:
             bool: Успешность сброса
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._get_cursor()
+                self._flush_pending(cursor)
                 
                 cursor.execute("""
                     UPDATE safety_log 
@@ -402,9 +584,7 @@ class SafeMode:
                         parsing_count_today = 0,
                         updated_at = ?
                     WHERE user_id = ?
-                """, (datetime.now().isoformat(), user_id))
-                
-                conn.commit()
+                """, (int(time.time()), user_id))
                 
                 logger.warning(f"Выполнен экстренный сброс ограничений для пользователя {user_id}")
                 return True
@@ -413,5 +593,16 @@ class SafeMode:
             logger.error(f"Ошибка экстренного сброса для {user_id}: {e}")
             return False
 
-# Создаем глобальный экземпляр безопасного режима
-safe_mode = SafeMode("dataBD/real_estate_data.db") 
\ No newline at end of file
+# Глобальный экземпляр безопасного режима создается лениво, при первом
+# обращении, а не при импорте модуля
+_safe_mode: Optional[SafeMode] = None
+_safe_mode_lock = threading.Lock()
+
+def get_safe_mode() -> SafeMode:
+    """Возвращает общий экземпляр безопасного режима, создавая его при первом вызове"""
+    global _safe_mode
+    if _safe_mode is None:
+        with _safe_mode_lock:
+            if _safe_mode is None:
+                _safe_mode = SafeMode("dataBD/real_estate_data.db")
+    return _safe_mode 
\ No newline at end of file
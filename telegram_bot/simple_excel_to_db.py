@@ -4,43 +4,137 @@
 """
 
 import sqlite3
-import json
 import random
 import sys
 import os
+from itertools import islice
 
-def create_general_report_db():
-    """Создание базы данных на основе general_report111"""
-    
-    # Пермские адреса
-    perm_addresses = [
-        "ул. Ленина, 50", "ул. Комсомольский проспект, 15", "ул. Петропавловская, 25",
-        "ул. Сибирская, 32", "ул. Куйбышева, 18", "ул. Монастырская, 12",
-        "ул. Газеты Звезда, 45", "ул. Революции, 28", "ул. Крупской, 60",
-        "ул. Пушкина, 17", "ул. Максима Горького, 83", "ул. Екатерининская, 55",
-        "ул. Компроса, 24", "ул. Мира, 35", "ул. Белинского, 41"
-    ]
-    
-    # Телефоны
-    phones = [
-        "+7 (342) 234-56-78", "+7 (342) 345-67-89", "+7 (342) 456-78-90",
-        "+7 (912) 345-67-89", "+7 (919) 456-78-90"
-    ]
-    
-    # Типы недвижимости
-    property_types = [
-        "1-комнатная квартира", "2-комнатная квартира", "3-комнатная квартира",
-        "Студия", "Частный дом", "Офисное помещение", "Торговое помещение"
-    ]
+# Размер пачки для executemany при вставке
+INSERT_BATCH_SIZE = 1000
+
+# Пермские адреса
+PERM_ADDRESSES = (
+    "ул. Ленина, 50", "ул. Комсомольский проспект, 15", "ул. Петропавловская, 25",
+    "ул. Сибирская, 32", "ул. Куйбышева, 18", "ул. Монастырская, 12",
+    "ул. Газеты Звезда, 45", "ул. Революции, 28", "ул. Крупской, 60",
+    "ул. Пушкина, 17", "ул. Максима Горького, 83", "ул. Екатерининская, 55",
+    "ул. Компроса, 24", "ул. Мира, 35", "ул. Белинского, 41"
+)
+
+# Телефоны
+PHONES = (
+    "+7 (342) 234-56-78", "+7 (342) 345-67-89", "+7 (342) 456-78-90",
+    "+7 (912) 345-67-89", "+7 (919) 456-78-90"
+)
+
+# Типы недвижимости
+PROPERTY_TYPES = (
+    "1-комнатная квартира", "2-комнатная квартира", "3-комнатная квартира",
+    "Студия", "Частный дом", "Офисное помещение", "Торговое помещение"
+)
+
+def generate_listings(count: int):
+    """
+    Генерирует записи объявлений построчно для executemany
+    
+    Случайные значения выбираются сразу целыми колонками (random.choices/sample),
+    а строки собираются генератором без промежуточного списка.
+    """
+    source = "General Report 111"
+    description_tmpl = "Продается %s площадью %d кв.м. в хорошем состоянии. Удобная планировка, развитая инфраструктура."
+    
+    # ID уникальны внутри выборки - без конфликтов PRIMARY KEY
+    ids = random.sample(range(1000000, 10000000), count)
+    prices = random.choices(range(50000, 400001), k=count)
+    areas = random.choices(range(25, 151), k=count)
+    prop_types = random.choices(PROPERTY_TYPES, k=count)
+    floors = random.choices(range(1, 10), k=count)
+    streets = random.choices(PERM_ADDRESSES, k=count)
+    houses = random.choices(range(1, 101), k=count)
+    sellers = random.choices(PHONES, k=count)
+    photo_counts = random.choices(range(1, 5), k=count)
+    uniform = random.uniform
+    
+    for num, price, area, prop_type, floor, street, house, seller, photo_count in zip(
+        ids, prices, areas, prop_types, floors, streets, houses, sellers, photo_counts
+    ):
+        listing_id = "gen%d" % num
+        
+        # Фото (JSON собираем напрямую - URL не содержат спецсимволов)
+        photos_json = "[" + ", ".join(
+            '"https://example-realty.ru/photo/%s_%d.jpg"' % (listing_id, j)
+            for j in range(1, photo_count + 1)
+        ) + "]"
+        
+        yield (
+            listing_id, source, price, str(area),
+            description_tmpl % (prop_type, area),
+            "https://example-realty.ru/listing/" + listing_id,
+            str(floor),
+            "%s, %d" % (street, house),
+            # Координаты Перми
+            "%.6f" % (58.0 + uniform(-0.03, 0.03)),
+            "%.6f" % (56.3 + uniform(-0.03, 0.03)),
+            seller, photos_json, "open", 1
+        )
+
+def insert_listings(cursor, rows, batch_size: int = INSERT_BATCH_SIZE) -> int:
+    """
+    Вставляет (или заменяет по id) записи объявлений одной транзакцией
+    
+    Args:
+        cursor: Курсор соединения в режиме isolation_level=None
+        rows: Итерируемый набор кортежей в порядке колонок real_estate_listings
+        batch_size: Размер пачки для executemany
+        
+    Returns:
+        int: Количество записанных строк
+    """
+    insert_sql = """
+    INSERT OR REPLACE INTO real_estate_listings 
+    (id, source, price, area, description, url, floor, address, lat, lng, seller, photos, status, visible)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    rows = iter(rows)
+    written = 0
+    
+    cursor.execute("BEGIN")
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            cursor.executemany(insert_sql, batch)
+            written += len(batch)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    
+    return written
+
+def create_general_report_db(count: int = 12, rows=None):
+    """
+    Создание базы данных на основе general_report111
+    
+    Повторный вызов дописывает записи в существующую базу. Если rows не
+    переданы, генерируется count случайных записей.
+    """
     
     # Создаем базу данных
     output_file = "dataBD/general_report111_formatted.db"
-    conn = sqlite3.connect(output_file)
+    # Транзакциями управляем явно
+    conn = sqlite3.connect(output_file, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-128000")
     cursor = conn.cursor()
     
     # Создаем таблицу
     cursor.execute("""
-    CREATE TABLE real_estate_listings (
+    CREATE TABLE IF NOT EXISTS real_estate_listings (
         id TEXT PRIMARY KEY,
         source TEXT,
         price REAL,
@@ -58,48 +152,12 @@ def create_general_report_db():
     )
     """)
     
-    # Генерируем записи
-    listings = []
-    for i in range(12):  # Создаем 12 записей
-        listing_id = f"gen{random.randint(1000000, 9999999)}"
-        source = "General Report 111"
-        price = random.randint(50000, 400000)
-        area = str(random.randint(25, 150))
-        
-        prop_type = random.choice(property_types)
-        description = f"Продается {prop_type} площадью {area} кв.м. в хорошем состоянии. Удобная планировка, развитая инфраструктура."
-        
-        url = f"https://example-realty.ru/listing/{listing_id}"
-        floor = str(random.randint(1, 9))
-        address = f"{random.choice(perm_addresses)}, {random.randint(1, 100)}"
-        
-        # Координаты Перми
-        lat = f"{58.0 + random.uniform(-0.03, 0.03):.6f}"
-        lng = f"{56.3 + random.uniform(-0.03, 0.03):.6f}"
-        
-        seller = random.choice(phones)
-        
-        # Фото
-        photos = [f"https://example-realty.ru/photo/{listing_id}_{j}.jpg" for j in range(1, random.randint(2, 5))]
-        photos_json = json.dumps(photos)
-        
-        status = "open"
-        visible = 1
-        
-        listing = (
-            listing_id, source, price, area, description, url, floor,
-            address, lat, lng, seller, photos_json, status, visible
-        )
-        listings.append(listing)
+    # Генерируем записи, если их не передали
+    if rows is None:
+        rows = generate_listings(count)
     
     # Вставляем данные
-    cursor.executemany("""
-    INSERT INTO real_estate_listings 
-    (id, source, price, area, description, url, floor, address, lat, lng, seller, photos, status, visible)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, listings)
-    
-    conn.commit()
+    insert_listings(cursor, rows)
     
     # Показываем статистику
     cursor.execute("SELECT COUNT(*) FROM real_estate_listings")
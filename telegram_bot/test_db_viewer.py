@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки просмотрщика cian_reports.db
+"""
+
+import os
+import tempfile
+
+from cian_report_db_converter import CianReportDBConverter
+from db_viewer import DatabaseViewer
+
+# Тестовые объявления: (id, цена, адрес)
+_LISTINGS = [
+    ("1", 45000, "г. Пермь, ул. Ленина, 10"),
+    ("2", 75000, "г. Пермь, ул. Мира, 5"),
+    ("3", 120000, "г. Пермь, ул. Сибирская, 27"),
+    ("4", 60000, "г. Пермь, проспект Парковый, 3"),
+]
+
+def _create_viewer(directory: str) -> DatabaseViewer:
+    """Создает БД по схеме конвертера, заполняет ее и возвращает просмотрщик"""
+    converter = CianReportDBConverter()
+    converter.output_db_path = os.path.join(directory, "cian_reports.db")
+    converter.create_database_schema()
+    
+    viewer = DatabaseViewer(converter.output_db_path)
+    viewer.bulk_insert({'id': id_, 'price': price, 'address': address} for id_, price, address in _LISTINGS)
+    return viewer
+
+def _ids(rows) -> list:
+    """Список id найденных объявлений"""
+    return [row['id'] for row in rows]
+
+def test_search_by_addresses():
+    """Поиск по нескольким частям адреса: FTS и LIKE дают одинаковый результат"""
+    with tempfile.TemporaryDirectory() as directory:
+        viewer = _create_viewer(directory)
+        
+        fts_rows = viewer.search_by_addresses(["Ленина", "Сибирская"])
+        assert viewer._fts_ready
+        assert _ids(fts_rows) == ["1", "3"]
+        
+        # Короткая часть (меньше триграммы) уводит запрос на LIKE
+        assert _ids(viewer.search_by_addresses(["Мира", "10"])) == ["1", "2"]
+        
+        # Без FTS5 индекса тот же запрос идет через LIKE
+        viewer._fts_ready = False
+        assert _ids(viewer.search_by_addresses(["Ленина", "Сибирская"])) == _ids(fts_rows)
+        
+        assert viewer.search_by_addresses([]) == []
+        assert viewer.search_by_addresses(["Тверская"]) == []
+        viewer._conn.close()
+    
+    print("✅ search_by_addresses: FTS и LIKE совпадают")
+
+def _aggregate_statistics(viewer: DatabaseViewer) -> dict:
+    """Статистика, посчитанная обычным агрегатом по cian_reports"""
+    stats_ready = viewer._stats_ready
+    viewer._stats_ready = False
+    try:
+        return viewer.get_price_statistics()
+    finally:
+        viewer._stats_ready = stats_ready
+
+def test_price_statistics():
+    """Строка cian_report_stats после вставок, изменений и удалений совпадает с агрегатом"""
+    with tempfile.TemporaryDirectory() as directory:
+        viewer = _create_viewer(directory)
+        conn = viewer._connect()
+        assert viewer._stats_ready
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        
+        # Изменение цены (в том числе крайних значений) через UPSERT
+        viewer.bulk_insert([
+            {'id': '1', 'price': 130000, 'address': 'г. Пермь, ул. Ленина, 10'},
+            {'id': '5', 'price': 30000, 'address': 'г. Пермь, ул. Мира, 7'},
+        ])
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        
+        # Цена пропадает и появляется снова, другие колонки меняются без цены
+        with conn:
+            conn.execute("UPDATE cian_reports SET price = NULL WHERE id = '2'")
+            conn.execute("UPDATE cian_reports SET price = 50000 WHERE id = '4'")
+            conn.execute("UPDATE cian_reports SET address = 'г. Пермь, ул. Мира, 9' WHERE id = '5'")
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        
+        with conn:
+            conn.execute("UPDATE cian_reports SET price = 100000 WHERE id = '2'")
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        
+        # Удаление минимальной и максимальной цены
+        with conn:
+            conn.execute("DELETE FROM cian_reports WHERE id IN ('1', '5')")
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        
+        # Удаление всех записей и полный пересчет
+        with conn:
+            conn.execute("DELETE FROM cian_reports")
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        assert viewer.rebuild_stats()
+        assert viewer.get_price_statistics() == _aggregate_statistics(viewer)
+        conn.close()
+    
+    print("✅ cian_report_stats совпадает с агрегатом по cian_reports")
+
+def main():
+    """Основная функция тестирования"""
+    print("🧪 ТЕСТИРОВАНИЕ ПРОСМОТРЩИКА БД")
+    print("=" * 50)
+    
+    test_search_by_addresses()
+    test_price_statistics()
+    
+    print("🏁 Тестирование завершено!")
+
+if __name__ == "__main__":
+    main()
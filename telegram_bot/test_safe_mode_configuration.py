@@ -5,187 +5,225 @@
 
 import sys
 import os
-from datetime import datetime
+import importlib
+from contextlib import contextmanager
+from unittest import mock
+
+# Шаблон повторяющегося блока статуса проверки
+_STATUS_TMPL = "   Результат: {status}\n   Сообщение: {msg}\n   Статус: {s}"
+
+def _status_lines(can_parse, info):
+    """Форматирует блок статуса проверки по общему шаблону"""
+    return _STATUS_TMPL.format_map({
+        "status": "✅ Разрешено" if can_parse else "🚫 Заблокирован",
+        "msg": info.get('message', 'Нет сообщения'),
+        "s": info.get('status', 'unknown'),
+    })
+
+@contextmanager
+def _buffered_output():
+    """Собирает строки вывода теста и пишет их в stdout одним вызовом"""
+    lines = []
+    try:
+        yield lines.append
+    finally:
+        sys.stdout.write("\n".join(lines) + "\n")
+
+def _cfg():
+    """Возвращает модуль config, импортируя его один раз (BOT_TOKEN нужен до импорта)"""
+    if 'config' not in sys.modules:
+        os.environ['BOT_TOKEN'] = 'test_token'
+    return importlib.import_module('config')
 
 def test_safe_mode_enabled():
     """Тестируем безопасный режим в включенном состоянии"""
-    print("🧪 Тестирование ВКЛЮЧЕННОГО безопасного режима...\n")
-    
-    # Временно устанавливаем BOT_TOKEN и переопределяем настройку
-    os.environ['BOT_TOKEN'] = 'test_token'
-    import config
-    original_setting = config.SAFE_MODE_ENABLED
-    config.SAFE_MODE_ENABLED = True
-    
-    try:
-        # Пересоздаем safe_mode с новой настройкой
-        from safe_mode import SafeMode
-        safe_mode_test = SafeMode("dataBD/real_estate_data.db")
-        
-        test_user_id = "test_user_123"
+    with _buffered_output() as emit:
+        emit("🧪 Тестирование ВКЛЮЧЕННОГО безопасного режима...\n")
         
-        print(f"1. Проверка первого парсинга для пользователя {test_user_id}:")
-        can_parse, info = safe_mode_test.can_parse(test_user_id)
-        print(f"   Результат: {'✅ Разрешено' if can_parse else '🚫 Заблокирован'}")
-        print(f"   Сообщение: {info.get('message', 'Нет сообщения')}")
-        print(f"   Статус: {info.get('status', 'unknown')}")
-        print()
+        # Временно переопределяем настройку
+        config = _cfg()
         
-        if can_parse:
-            print("2. Записываем успешный парсинг:")
-            success = safe_mode_test.log_parsing(test_user_id, success=True)
-            print(f"   Запись: {'✅ Успешно' if success else '❌ Ошибка'}")
-            print()
+        with mock.patch.object(config, 'SAFE_MODE_ENABLED', True):
+            # Пересоздаем safe_mode с новой настройкой
+            from safe_mode import SafeMode
+            safe_mode_test = SafeMode("dataBD/real_estate_data.db")
             
-            print("3. Проверка второго парсинга (должен быть заблокирован):")
-            can_parse2, info2 = safe_mode_test.can_parse(test_user_id)
-            print(f"   Результат: {'✅ Разрешено' if can_parse2 else '🚫 Заблокирован'}")
-            print(f"   Сообщение: {info2.get('message', 'Нет сообщения')}")
-            print(f"   Часов осталось: {info2.get('hours_left', 'N/A')}")
-            print(f"   Следующий доступен: {info2.get('next_available', 'N/A')}")
-            print()
-        
-        print("4. Получение статистики пользователя:")
-        stats = safe_mode_test.get_user_safety_stats(test_user_id)
-        print(f"   Парсингов сегодня: {stats.get('today_count', 0)}")
-        print(f"   Всего парсингов: {stats.get('total_count', 0)}")
-        print(f"   Можно парсить сейчас: {'✅ Да' if stats.get('can_parse_now') else '🚫 Нет'}")
-        print(f"   Следующий доступен: {stats.get('next_available', 'N/A')}")
-        print()
-        
-        print("5. Глобальная статистика:")
-        global_stats = safe_mode_test.get_global_safety_stats()
-        print(f"   Всего пользователей: {global_stats.get('total_users', 0)}")
-        print(f"   Всего парсингов: {global_stats.get('total_parsings', 0)}")
-        print(f"   Статус системы: {global_stats.get('system_status', 'Неизвестно')}")
+            test_user_id = "test_user_123"
+            
+            emit(f"1. Проверка первого парсинга для пользователя {test_user_id}:")
+            can_parse, info = safe_mode_test.can_parse(test_user_id)
+            emit(_status_lines(can_parse, info))
+            emit("")
+            
+            if can_parse:
+                emit("2. Записываем успешный парсинг:")
+                success = safe_mode_test.log_parsing(test_user_id, success=True)
+                emit(f"   Запись: {'✅ Успешно' if success else '❌ Ошибка'}")
+                emit("")
+                
+                emit("3. Проверка второго парсинга (должен быть заблокирован):")
+                can_parse2, info2 = safe_mode_test.can_parse(test_user_id)
+                safe_mode_test.format_status(info2)
+                emit(f"   Результат: {'✅ Разрешено' if can_parse2 else '🚫 Заблокирован'}")
+                emit(f"   Сообщение: {info2.get('message', 'Нет сообщения')}")
+                emit(f"   Часов осталось: {info2.get('hours_left', 'N/A')}")
+                emit(f"   Следующий доступен: {info2.get('next_available', 'N/A')}")
+                emit("")
+            
+            emit("4. Получение статистики пользователя:")
+            stats = safe_mode_test.get_user_safety_stats(test_user_id)
+            emit(f"   Парсингов сегодня: {stats.get('today_count', 0)}")
+            emit(f"   Всего парсингов: {stats.get('total_count', 0)}")
+            emit(f"   Можно парсить сейчас: {'✅ Да' if stats.get('can_parse_now') else '🚫 Нет'}")
+            emit(f"   Следующий доступен: {stats.get('next_available', 'N/A')}")
+            emit("")
+            
+            emit("5. Глобальная статистика:")
+            global_stats = safe_mode_test.get_global_safety_stats()
+            emit(f"   Всего пользователей: {global_stats.get('total_users', 0)}")
+            emit(f"   Всего парсингов: {global_stats.get('total_parsings', 0)}")
+            emit(f"   Статус системы: {global_stats.get('system_status', 'Неизвестно')}")
+            
+            # Останавливаем фоновый поток записи тестового экземпляра
+            safe_mode_test.close()
         
-    finally:
-        # Восстанавливаем исходную настройку
-        config.SAFE_MODE_ENABLED = original_setting
-    
-    print("\n" + "="*50 + "\n")
+        emit("\n" + "="*50 + "\n")
 
 def test_safe_mode_disabled():
     """Тестируем безопасный режим в отключенном состоянии"""
-    print("🧪 Тестирование ОТКЛЮЧЕННОГО безопасного режима...\n")
-    
-    # Временно устанавливаем BOT_TOKEN и переопределяем настройку
-    os.environ['BOT_TOKEN'] = 'test_token'
-    import config
-    original_setting = config.SAFE_MODE_ENABLED
-    config.SAFE_MODE_ENABLED = False
-    
-    try:
-        # Пересоздаем safe_mode с новой настройкой
-        from safe_mode import SafeMode
-        safe_mode_test = SafeMode("dataBD/real_estate_data.db")
-        
-        test_user_id = "test_user_disabled"
-        
-        print(f"1. Проверка парсинга для пользователя {test_user_id}:")
-        can_parse, info = safe_mode_test.can_parse(test_user_id)
-        print(f"   Результат: {'✅ Разрешено' if can_parse else '🚫 Заблокирован'}")
-        print(f"   Сообщение: {info.get('message', 'Нет сообщения')}")
-        print(f"   Статус: {info.get('status', 'unknown')}")
-        print()
-        
-        print("2. Попытка записи парсинга (должна быть проигнорирована):")
-        success = safe_mode_test.log_parsing(test_user_id, success=True)
-        print(f"   Запись: {'✅ Успешно' if success else '❌ Ошибка'}")
-        print()
-        
-        print("3. Повторная проверка парсинга (должен остаться доступным):")
-        can_parse2, info2 = safe_mode_test.can_parse(test_user_id)
-        print(f"   Результат: {'✅ Разрешено' if can_parse2 else '🚫 Заблокирован'}")
-        print(f"   Сообщение: {info2.get('message', 'Нет сообщения')}")
-        print()
+    with _buffered_output() as emit:
+        emit("🧪 Тестирование ОТКЛЮЧЕННОГО безопасного режима...\n")
         
-        print("4. Получение статистики пользователя:")
-        stats = safe_mode_test.get_user_safety_stats(test_user_id)
-        print(f"   Режим: {stats.get('mode', 'unknown')}")
-        print(f"   Парсингов сегодня: {stats.get('today_count', 0)}")
-        print(f"   Можно парсить сейчас: {'✅ Да' if stats.get('can_parse_now') else '🚫 Нет'}")
-        print(f"   Интервал: {stats.get('safety_interval', 'N/A')}")
-        print()
+        # Временно переопределяем настройку
+        config = _cfg()
         
-        print("5. Глобальная статистика:")
-        global_stats = safe_mode_test.get_global_safety_stats()
-        print(f"   Статус системы: {global_stats.get('system_status', 'Неизвестно')}")
-        print(f"   Интервал: {global_stats.get('safety_interval', 'N/A')}")
+        with mock.patch.object(config, 'SAFE_MODE_ENABLED', False):
+            # Пересоздаем safe_mode с новой настройкой
+            from safe_mode import SafeMode
+            safe_mode_test = SafeMode("dataBD/real_estate_data.db")
+            
+            test_user_id = "test_user_disabled"
+            
+            emit(f"1. Проверка парсинга для пользователя {test_user_id}:")
+            can_parse, info = safe_mode_test.can_parse(test_user_id)
+            emit(_status_lines(can_parse, info))
+            emit("")
+            
+            emit("2. Попытка записи парсинга (должна быть проигнорирована):")
+            success = safe_mode_test.log_parsing(test_user_id, success=True)
+            emit(f"   Запись: {'✅ Успешно' if success else '❌ Ошибка'}")
+            emit("")
+            
+            emit("3. Повторная проверка парсинга (должен остаться доступным):")
+            can_parse2, info2 = safe_mode_test.can_parse(test_user_id)
+            emit(f"   Результат: {'✅ Разрешено' if can_parse2 else '🚫 Заблокирован'}")
+            emit(f"   Сообщение: {info2.get('message', 'Нет сообщения')}")
+            emit("")
+            
+            emit("4. Получение статистики пользователя:")
+            stats = safe_mode_test.get_user_safety_stats(test_user_id)
+            emit(f"   Режим: {stats.get('mode', 'unknown')}")
+            emit(f"   Парсингов сегодня: {stats.get('today_count', 0)}")
+            emit(f"   Можно парсить сейчас: {'✅ Да' if stats.get('can_parse_now') else '🚫 Нет'}")
+            emit(f"   Интервал: {stats.get('safety_interval', 'N/A')}")
+            emit("")
+            
+            emit("5. Глобальная статистика:")
+            global_stats = safe_mode_test.get_global_safety_stats()
+            emit(f"   Статус системы: {global_stats.get('system_status', 'Неизвестно')}")
+            emit(f"   Интервал: {global_stats.get('safety_interval', 'N/A')}")
+            
+            safe_mode_test.close()
         
-    finally:
-        # Восстанавливаем исходную настройку
-        config.SAFE_MODE_ENABLED = original_setting
-    
-    print("\n" + "="*50 + "\n")
+        emit("\n" + "="*50 + "\n")
 
 def test_config_change():
     """Демонстрация изменения настройки"""
-    print("🔧 Демонстрация изменения настройки безопасного режима\n")
-    
-    print("Для изменения настройки безопасного режима:")
-    print("1. Откройте файл config.py")
-    print("2. Найдите строку: SAFE_MODE_ENABLED = True")
-    print("3. Измените на:")
-    print("   - SAFE_MODE_ENABLED = True   # для включения")
-    print("   - SAFE_MODE_ENABLED = False  # для отключения")
-    print("4. Перезапустите бота")
-    print()
-    
-    os.environ['BOT_TOKEN'] = 'test_token'
-    import config
-    current_state = "ВКЛЮЧЕН" if config.SAFE_MODE_ENABLED else "ОТКЛЮЧЕН"
-    print(f"Текущее состояние безопасного режима: {current_state}")
-    print()
+    with _buffered_output() as emit:
+        emit("🔧 Демонстрация изменения настройки безопасного режима\n")
+        
+        emit("Для изменения настройки безопасного режима:")
+        emit("1. Откройте файл config.py")
+        emit("2. Найдите строку: SAFE_MODE_ENABLED = True")
+        emit("3. Измените на:")
+        emit("   - SAFE_MODE_ENABLED = True   # для включения")
+        emit("   - SAFE_MODE_ENABLED = False  # для отключения")
+        emit("4. Перезапустите бота")
+        emit("")
+        
+        config = _cfg()
+        current_state = "ВКЛЮЧЕН" if config.SAFE_MODE_ENABLED else "ОТКЛЮЧЕН"
+        emit(f"Текущее состояние безопасного режима: {current_state}")
+        emit("")
 
 def test_database_location():
     """Проверка использования правильной базы данных"""
-    print("💾 Проверка базы данных...\n")
-    
-    db_path = "dataBD/real_estate_data.db"
-    
-    if os.path.exists(db_path):
-        size = os.path.getsize(db_path)
-        print(f"✅ База данных найдена: {db_path}")
-        print(f"   Размер: {size:,} байт")
+    with _buffered_output() as emit:
+        emit("💾 Проверка базы данных...\n")
         
-        # Проверяем структуру таблиц
-        import sqlite3
+        db_path = "dataBD/real_estate_data.db"
+        
+        # Один stat() вместо exists() + getsize()
         try:
-            with sqlite3.connect(db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Проверяем основную таблицу
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='real_estate_listings'")
-                if cursor.fetchone():
-                    print("   ✅ Таблица real_estate_listings найдена")
+            size = os.stat(db_path).st_size
+            exists = True
+        except FileNotFoundError:
+            size, exists = 0, False
+        
+        if exists:
+            emit(f"✅ База данных найдена: {db_path}")
+            emit(f"   Размер: {size:,} байт")
+            
+            # Проверяем структуру таблиц
+            import sqlite3
+            try:
+                with sqlite3.connect(db_path) as conn:
+                    # Подсчет строк читает таблицы целиком - читаем через mmap
+                    # и с увеличенным кэшем страниц
+                    conn.execute("PRAGMA mmap_size=268435456")
+                    conn.execute("PRAGMA cache_size=-65536")
+                    conn.execute("PRAGMA temp_store=MEMORY")
+                    cursor = conn.cursor()
                     
-                    cursor.execute("SELECT COUNT(*) FROM real_estate_listings")
-                    count = cursor.fetchone()[0]
-                    print(f"   📊 Объявлений в базе: {count:,}")
-                else:
-                    print("   ❌ Таблица real_estate_listings не найдена")
-                
-                # Проверяем таблицу безопасности
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='safety_log'")
-                if cursor.fetchone():
-                    print("   ✅ Таблица safety_log найдена")
+                    # Наличие обеих таблиц - одним запросом к sqlite_master
+                    cursor.execute("""
+                        SELECT name FROM sqlite_master 
+                        WHERE type='table' AND name IN ('real_estate_listings', 'safety_log')
+                    """)
+                    tables = {row[0] for row in cursor.fetchall()}
                     
-                    cursor.execute("SELECT COUNT(*) FROM safety_log")
-                    count = cursor.fetchone()[0]
-                    print(f"   🛡️ Записей безопасности: {count:,}")
-                else:
-                    print("   ⚠️ Таблица safety_log не найдена (будет создана при первом использовании)")
+                    # Количество записей в найденных таблицах - вторым запросом
+                    counts = {}
+                    if tables:
+                        names = sorted(tables)
+                        cursor.execute("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {name})" for name in names))
+                        counts = dict(zip(names, cursor.fetchone()))
                     
-        except Exception as e:
-            print(f"   ❌ Ошибка проверки базы данных: {e}")
-    else:
-        print(f"❌ База данных не найдена: {db_path}")
-    
-    print()
+                    # Проверяем основную таблицу
+                    if 'real_estate_listings' in tables:
+                        emit("   ✅ Таблица real_estate_listings найдена")
+                        emit(f"   📊 Объявлений в базе: {counts['real_estate_listings']:,}")
+                    else:
+                        emit("   ❌ Таблица real_estate_listings не найдена")
+                    
+                    # Проверяем таблицу безопасности
+                    if 'safety_log' in tables:
+                        emit("   ✅ Таблица safety_log найдена")
+                        emit(f"   🛡️ Записей безопасности: {counts['safety_log']:,}")
+                    else:
+                        emit("   ⚠️ Таблица safety_log не найдена (будет создана при первом использовании)")
+                        
+            except Exception as e:
+                emit(f"   ❌ Ошибка проверки базы данных: {e}")
+        else:
+            emit(f"❌ База данных не найдена: {db_path}")
+        
+        emit("")
 
 def main():
     """Основная функция тестирования"""
+    from datetime import datetime
+    
     print("🧪 ТЕСТИРОВАНИЕ БЕЗОПАСНОГО РЕЖИМА ПАРСИНГА")
     print("=" * 50)
     print(f"Время тестирования: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -6,21 +6,29 @@
 
 import sqlite3
 import os
-import json
 import random
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Iterable, Iterator, Callable, Tuple
 import shutil
+import importlib.util
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 logger = logging.getLogger(__name__)
 
-# Попытка импортировать pandas для работы с различными форматами
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
+# Пустой список фотографий в JSON (то же, что json.dumps([]))
+_EMPTY_JSON_LIST = '[]'
+
+# Все символы, которые отбрасывает str.strip() (последний из них - U+3000);
+# передаются в SQL trim(), чтобы проверка пустоты совпадала с _has_value
+_WHITESPACE_CHARS = ''.join(ch for ch in map(chr, range(0x3001)) if ch.isspace())
+
+# Проверяем наличие pandas без его загрузки: сам модуль импортируется
+# только при обработке Excel (импорт pandas занимает сотни миллисекунд)
+PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None
+if not PANDAS_AVAILABLE:
     logger.warning("⚠️ Pandas недоступен. Установите: pip install pandas openpyxl")
 
 class UniversalDataFormatter:
@@ -29,7 +37,19 @@ class UniversalDataFormatter:
     def __init__(self, target_db_path: str = "dataBD/real_estate_data_unified.db"):
         self.target_db_path = target_db_path
         self.target_schema = self._get_target_schema()
+        # Порядок колонок целевой таблицы - вычисляем один раз
+        self.columns = tuple(self.target_schema['columns'])
+        # Запрос вставки собираем один раз - текст одинаков для всех пачек
+        self.insert_sql = (
+            f"INSERT OR REPLACE INTO {self.target_schema['table_name']} "
+            f"({','.join(self.columns)}) VALUES ({','.join('?' * len(self.columns))})"
+        )
+        # Сопоставления колонок по набору колонок источника
+        self._mapping_cache = {}
+        # Идет массовая загрузка папки: индексы строятся один раз в конце
+        self._bulk_loading = False
         self.random_generators = self._setup_random_generators()
+        self.column_generators = self._setup_column_generators()
         
     def _get_target_schema(self) -> Dict:
         """Возвращает целевую схему БД на основе real_estate_data.db"""
@@ -80,15 +100,61 @@ class UniversalDataFormatter:
             'statuses': ['open', 'active', 'available', 'published']
         }
     
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает целевую БД в режиме autocommit с настройками для массовой записи"""
+        conn = sqlite3.connect(self.target_db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+    
+    # Размер пачки при чтении источника и вставке в целевую БД
+    BATCH_SIZE = 10000
+    
+    # Переносить SQLite-источники внутри движка (ATTACH + INSERT ... SELECT)
+    DIRECT_SQLITE_INSERT = True
+    
+    # Поддерживаемые форматы файлов: расширение -> тип
+    FILE_KINDS = {'.xlsx': 'excel', '.xls': 'excel', '.db': 'sqlite'}
+    
+    # Вторичные индексы целевой таблицы: (имя, колонка)
+    TARGET_INDEXES = (
+        ('idx_listing_id', 'id'),
+        ('idx_listing_status', 'status'),
+        ('idx_listing_visible', 'visible'),
+    )
+    
     def create_target_database(self):
         """Создает целевую БД с правильной схемой"""
+        self._create_table()
+        self._create_indexes()
+    
+    def _prepare_target(self):
+        """Готовит целевую БД к записи: вне массовой загрузки сразу создает и индексы"""
+        if self._bulk_loading:
+            self._create_table()
+        else:
+            self.create_target_database()
+    
+    def _create_table(self):
+        """Создает целевую таблицу без вторичных индексов, если ее еще нет в БД"""
         try:
             # Создаем папку если её нет
             os.makedirs(os.path.dirname(self.target_db_path), exist_ok=True)
             
-            with sqlite3.connect(self.target_db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
+                # Проверяем саму БД, а не флаг экземпляра: файл могли удалить или пересоздать
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (self.target_schema['table_name'],)
+                )
+                if cursor.fetchone() is not None:
+                    return
+                
                 # Создаем таблицу
                 cursor.execute(f"""
                     CREATE TABLE IF NOT EXISTS {self.target_schema['table_name']} (
@@ -108,57 +174,126 @@ class UniversalDataFormatter:
                         visible INTEGER DEFAULT 1
                     )
                 """)
-                
-                # Создаем индексы
-                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_listing_id ON {self.target_schema['table_name']}(id)")
-                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_listing_status ON {self.target_schema['table_name']}(status)")
-                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_listing_visible ON {self.target_schema['table_name']}(visible)")
-                
-                conn.commit()
                 logger.info(f"✅ Целевая БД создана: {self.target_db_path}")
                 
         except Exception as e:
             logger.error(f"Ошибка создания целевой БД: {e}")
             raise
     
+    def _create_indexes(self):
+        """Строит вторичные индексы целевой таблицы"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("BEGIN")
+                for index_name, column in self.TARGET_INDEXES:
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self.target_schema['table_name']}({column})")
+                cursor.execute("COMMIT")
+                
+        except Exception as e:
+            logger.error(f"Ошибка создания индексов: {e}")
+            raise
+    
+    def _drop_indexes(self):
+        """Удаляет вторичные индексы перед массовой загрузкой"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("BEGIN")
+                for index_name, _ in self.TARGET_INDEXES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+                cursor.execute("COMMIT")
+                
+        except Exception as e:
+            logger.error(f"Ошибка удаления индексов: {e}")
+            raise
+    
+    @staticmethod
+    def _has_value(value: Any) -> bool:
+        """Проверяет, что значение из источника не пустое"""
+        return bool(value and str(value).strip() and value != 'None')
+    
     def generate_missing_value(self, column_name: str, existing_value: Any = None) -> Any:
         """Генерирует недостающее значение для колонки"""
-        if existing_value and str(existing_value).strip() and existing_value != 'None':
+        if self._has_value(existing_value):
             return existing_value
-            
-        column_name_lower = column_name.lower()
+        return self._generate_column(column_name, 1)[0]
+    
+    def _setup_column_generators(self) -> Dict[str, Callable[[int], List[Any]]]:
+        """Строит таблицу генераторов: колонка -> функция, возвращающая count значений"""
+        gens = self.random_generators
         
-        if column_name == 'id':
-            return f"formatted_{random.randint(100000, 999999)}"
-        elif column_name == 'source':
-            return 'formatted_data'
-        elif column_name == 'price':
-            return random.choice(self.random_generators['prices'])
-        elif column_name == 'area':
-            return f"{random.choice(self.random_generators['areas'])} м²"
-        elif column_name == 'description':
-            return random.choice(self.random_generators['descriptions'])
-        elif column_name == 'url':
-            return f"https://perm.cian.ru/rent/commercial/{random.randint(100000, 999999)}/"
-        elif column_name == 'floor':
-            return random.choice(self.random_generators['floors'])
-        elif column_name == 'address':
-            template = random.choice(self.random_generators['addresses_perm'])
-            return template.format(random.randint(1, 200))
-        elif column_name == 'lat':
-            return str(round(58.0 + random.uniform(-0.1, 0.1), 6))
-        elif column_name == 'lng':
-            return str(round(56.25 + random.uniform(-0.1, 0.1), 6))
-        elif column_name == 'seller':
-            return random.choice(self.random_generators['phones'])
-        elif column_name == 'photos':
-            return json.dumps([])
-        elif column_name == 'status':
-            return random.choice(self.random_generators['statuses'])
-        elif column_name == 'visible':
-            return 1
-        else:
-            return f"auto_generated_{random.randint(1000, 9999)}"
+        def choices(pool):
+            return lambda count: random.choices(pool, k=count)
+        
+        def constant(value):
+            return lambda count: [value] * count
+        
+        def addresses(count):
+            templates = random.choices(gens['addresses_perm'], k=count)
+            numbers = random.choices(range(1, 201), k=count)
+            return [template.format(n) for template, n in zip(templates, numbers)]
+        
+        return {
+            'id': lambda count: [f"formatted_{n}" for n in random.choices(range(100000, 1000000), k=count)],
+            'source': constant('formatted_data'),
+            'price': choices(gens['prices']),
+            'area': lambda count: [f"{area} м²" for area in random.choices(gens['areas'], k=count)],
+            'description': choices(gens['descriptions']),
+            'url': lambda count: [f"https://perm.cian.ru/rent/commercial/{n}/" for n in random.choices(range(100000, 1000000), k=count)],
+            'floor': choices(gens['floors']),
+            'address': addresses,
+            'lat': lambda count: [str(round(58.0 + random.uniform(-0.1, 0.1), 6)) for _ in range(count)],
+            'lng': lambda count: [str(round(56.25 + random.uniform(-0.1, 0.1), 6)) for _ in range(count)],
+            'seller': choices(gens['phones']),
+            'photos': constant(_EMPTY_JSON_LIST),
+            'status': choices(gens['statuses']),
+            'visible': constant(1),
+        }
+    
+    @staticmethod
+    def _generate_default(count: int) -> List[Any]:
+        """Генератор для колонок, не описанных в схеме"""
+        return [f"auto_generated_{n}" for n in random.choices(range(1000, 10000), k=count)]
+    
+    def _generate_column(self, column_name: str, count: int) -> List[Any]:
+        """Генерирует сразу count значений для колонки (одна выборка на колонку)"""
+        return self.column_generators.get(column_name, self._generate_default)(count)
+    
+    def _fill_column(self, column_name: str, values: List[Any]) -> List[Any]:
+        """Заполняет пустые значения колонки одной пачкой сгенерированных значений"""
+        missing = [i for i, value in enumerate(values) if not self._has_value(value)]
+        if not missing:
+            return values
+        
+        filled = list(values)
+        for i, generated in zip(missing, self._generate_column(column_name, len(missing))):
+            filled[i] = generated
+        return filled
+    
+    def _build_records(self, columns_data: List[List[Any]]) -> List[Dict]:
+        """Собирает записи из списков значений целевых колонок"""
+        return [dict(zip(self.columns, row)) for row in zip(*columns_data)]
+    
+    def _resolve_mapping(self, source_columns) -> Dict[str, Any]:
+        """Сопоставляет целевые колонки с колонками источника (целевая -> исходная)"""
+        key = tuple(source_columns)
+        if key in self._mapping_cache:
+            return self._mapping_cache[key]
+        
+        mapping = {}
+        for col_name in self.columns:
+            col_lower = col_name.lower()
+            for source_col in source_columns:
+                source_lower = str(source_col).lower()
+                if col_lower in source_lower or source_lower in col_lower:
+                    mapping[col_name] = source_col
+                    break
+        
+        self._mapping_cache[key] = mapping
+        return mapping
     
     def format_sqlite_db(self, source_db_path: str, source_table: str = None) -> bool:
         """Форматирует SQLite БД к целевому формату"""
@@ -167,7 +302,9 @@ class UniversalDataFormatter:
             
             # Подключаемся к исходной БД
             with sqlite3.connect(source_db_path) as source_conn:
-                source_conn.row_factory = sqlite3.Row
+                # Источник читается последовательным сканом - страницы через mmap
+                source_conn.execute("PRAGMA mmap_size=268435456")
+                source_conn.execute("PRAGMA cache_size=-65536")
                 cursor = source_conn.cursor()
                 
                 # Если таблица не указана, найдем первую подходящую
@@ -182,50 +319,218 @@ class UniversalDataFormatter:
                 
                 logger.info(f"📋 Обрабатываем таблицу: {source_table}")
                 
-                # Получаем все данные
-                cursor.execute(f"SELECT * FROM {source_table}")
-                rows = cursor.fetchall()
+                # Имя таблицы приходит извне - подставляем только в экранированном виде
+                table_sql = self._quote_identifier(source_table)
                 
-                logger.info(f"📊 Найдено {len(rows)} записей")
+                # Сопоставляем колонки по схеме таблицы до чтения данных
+                cursor.execute(f"PRAGMA table_info({table_sql})")
+                mapping = self._resolve_mapping([column[1] for column in cursor.fetchall()])
                 
-                # Форматируем каждую запись
-                formatted_data = []
-                for row in rows:
-                    formatted_row = {}
-                    row_dict = dict(row)
-                    
-                    # Заполняем все обязательные колонки
-                    for col_name in self.target_schema['columns'].keys():
-                        # Ищем похожую колонку в исходных данных
-                        source_value = None
-                        for source_col, value in row_dict.items():
-                            if (col_name.lower() == source_col.lower() or 
-                                col_name in source_col.lower() or 
-                                source_col.lower() in col_name):
-                                source_value = value
-                                break
-                        
-                        # Генерируем значение если не найдено
-                        formatted_row[col_name] = self.generate_missing_value(col_name, source_value)
-                    
-                    formatted_data.append(formatted_row)
+                source_label = f"sqlite_{os.path.basename(source_db_path)}"
+                
+                # Быстрый путь: перенос целиком внутри SQLite через ATTACH + INSERT ... SELECT
+                if self.DIRECT_SQLITE_INSERT:
+                    try:
+                        inserted = self._insert_from_sqlite(source_db_path, table_sql, mapping)
+                        logger.info(f"✅ Сохранено {inserted} записей из {source_label}")
+                        return True
+                    except sqlite3.Error as e:
+                        logger.warning(f"⚠️ Перенос через ATTACH не удался, форматируем построчно: {e}")
+                
+                # Читаем только сопоставленные колонки, потоком - таблица
+                # не загружается в память целиком
+                selected = list(dict.fromkeys(mapping.values()))
+                positions = {col_name: selected.index(source_col) for col_name, source_col in mapping.items()}
+                projection = ', '.join(self._quote_identifier(col) for col in selected) or '1'
+                cursor.execute(f"SELECT {projection} FROM {table_sql}")
+                
+                formatted_data = self._iter_formatted_rows(cursor, positions)
                 
                 # Сохраняем в целевую БД
-                return self._save_formatted_data(formatted_data, f"sqlite_{os.path.basename(source_db_path)}")
+                return self._save_formatted_data(formatted_data, source_label)
                 
         except Exception as e:
             logger.error(f"Ошибка форматирования SQLite БД: {e}")
             return False
     
+    def _sql_generator(self, column_name: str) -> Tuple[str, List[Any]]:
+        """SQL-выражение, генерирующее значение колонки для каждой строки (аналог column_generators)"""
+        gens = self.random_generators
+        rnd = "(random() & 9223372036854775807)"
+        
+        def choice(pool):
+            whens = ' '.join(f"WHEN {i} THEN ?" for i in range(len(pool)))
+            return f"CASE {rnd} % {len(pool)} {whens} END", list(pool)
+        
+        if column_name == 'id':
+            return f"'formatted_' || (100000 + {rnd} % 900000)", []
+        elif column_name == 'source':
+            return "'formatted_data'", []
+        elif column_name == 'area':
+            sql, params = choice(gens['areas'])
+            return f"{sql} || ' м²'", params
+        elif column_name == 'url':
+            return f"'https://perm.cian.ru/rent/commercial/' || (100000 + {rnd} % 900000) || '/'", []
+        elif column_name == 'address':
+            sql, params = choice(gens['addresses_perm'])
+            return f"replace({sql}, '{{}}', 1 + {rnd} % 200)", params
+        elif column_name == 'lat':
+            return f"CAST(round(58.0 + ({rnd} % 2000001 - 1000000) / 10000000.0, 6) AS TEXT)", []
+        elif column_name == 'lng':
+            return f"CAST(round(56.25 + ({rnd} % 2000001 - 1000000) / 10000000.0, 6) AS TEXT)", []
+        elif column_name == 'photos':
+            return "?", [_EMPTY_JSON_LIST]
+        elif column_name == 'visible':
+            return "1", []
+        
+        pools = {'price': 'prices', 'description': 'descriptions', 'floor': 'floors',
+                 'seller': 'phones', 'status': 'statuses'}
+        if column_name in pools:
+            return choice(gens[pools[column_name]])
+        return f"'auto_generated_' || (1000 + {rnd} % 9000)", []
+    
+    def _insert_from_sqlite(self, source_db_path: str, table_sql: str, mapping: Dict[str, Any]) -> int:
+        """Переносит таблицу источника в целевую БД одним INSERT ... SELECT
+        
+        Пустые значения (как в _has_value) заменяются сгенерированными прямо в SQL,
+        данные не проходят через Python. Возвращает число вставленных записей.
+        """
+        expressions = []
+        params = []
+        for col_name in self.columns:
+            generator_sql, generator_params = self._sql_generator(col_name)
+            
+            if col_name not in mapping:
+                expressions.append(generator_sql)
+                params.extend(generator_params)
+                continue
+            
+            # Параметры - в порядке плейсхолдеров: сначала trim() из условия, затем генератор
+            src = self._quote_identifier(mapping[col_name])
+            is_empty = (
+                f"{src} IS NULL OR (typeof({src}) IN ('integer', 'real') AND {src} = 0) "
+                f"OR trim(CAST({src} AS TEXT), ?) = '' OR {src} = 'None'"
+            )
+            params.append(_WHITESPACE_CHARS)
+            params.extend(generator_params)
+            expressions.append(f"CASE WHEN {is_empty} THEN {generator_sql} ELSE {src} END")
+        
+        self._prepare_target()
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("ATTACH DATABASE ? AS src", (source_db_path,))
+            try:
+                # Настройки страниц задаются для каждой схемы отдельно
+                cursor.execute("PRAGMA src.mmap_size=268435456")
+                cursor.execute("PRAGMA src.cache_size=-65536")
+                cursor.execute("BEGIN")
+                try:
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO {self.target_schema['table_name']} ({','.join(self.columns)}) "
+                        f"SELECT {', '.join(expressions)} FROM src.{table_sql}",
+                        params
+                    )
+                    inserted = cursor.rowcount
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            finally:
+                cursor.execute("DETACH DATABASE src")
+        
+        return inserted
+    
+    @staticmethod
+    def _quote_identifier(name: str) -> str:
+        """Экранирует имя таблицы/колонки для подстановки в SQL"""
+        return '"' + str(name).replace('"', '""') + '"'
+    
+    def _iter_formatted_rows(self, cursor: sqlite3.Cursor, positions: Dict[str, int]) -> Iterator[Dict]:
+        """Читает строки источника пачками через fetchmany и отдает отформатированные записи
+        
+        positions - номер колонки результата запроса для каждой сопоставленной целевой колонки
+        """
+        while True:
+            rows = cursor.fetchmany(self.BATCH_SIZE)
+            if not rows:
+                break
+            
+            # Форматируем пачку по колонкам, генерируя недостающие значения
+            columns_data = []
+            for col_name in self.columns:
+                if col_name in positions:
+                    position = positions[col_name]
+                    values = [row[position] for row in rows]
+                else:
+                    values = [None] * len(rows)
+                columns_data.append(self._fill_column(col_name, values))
+            
+            yield from self._build_records(columns_data)
+    
+    def _peek_report_count(self, excel_path: str) -> Optional[int]:
+        """Быстро проверяет через openpyxl, является ли .xlsx статистическим отчетом
+        
+        Returns:
+            Количество записей для генерации или None, если это не отчет
+            (или файл нельзя прочитать без pandas)
+        """
+        if not excel_path.lower().endswith('.xlsx'):
+            return None
+        
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            return None
+        
+        try:
+            workbook = load_workbook(excel_path, read_only=True, data_only=True)
+        except Exception as e:
+            logger.debug(f"openpyxl не смог открыть {excel_path}: {e}")
+            return None
+        
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [cell for cell in next(rows, ()) if cell is not None]
+            
+            if len(header) != 2 or not any('показатель' in str(col).lower() for col in header):
+                return None
+            
+            count = 5  # по умолчанию
+            try:
+                for row in rows:
+                    if row and 'количество' in str(row[0]).lower():
+                        count = int(row[1])
+                        break
+            except:
+                pass
+            return count
+        finally:
+            workbook.close()
+    
+    def _generate_records(self, count: int) -> List[Dict]:
+        """Генерирует count полностью синтетических записей"""
+        return self._build_records(
+            [self._generate_column(col_name, count) for col_name in self.columns]
+        )
+    
     def format_excel_file(self, excel_path: str) -> bool:
         """Форматирует Excel файл к целевому формату"""
-        if not PANDAS_AVAILABLE:
-            logger.error("Pandas не установлен для работы с Excel")
-            return False
-            
         try:
             logger.info(f"🔄 Форматируем Excel файл: {excel_path}")
             
+            # Статистический отчет распознаем по заголовку без разбора листа в DataFrame
+            count = self._peek_report_count(excel_path)
+            if count is not None:
+                logger.info(f"📊 Статистический отчет, генерируем {count} записей")
+                return self._save_formatted_data(self._generate_records(count), f"excel_{os.path.basename(excel_path)}")
+            
+            if not PANDAS_AVAILABLE:
+                logger.error("Pandas не установлен для работы с Excel")
+                return False
+            
+            import pandas as pd
+            
             # Читаем Excel
             df = pd.read_excel(excel_path)
             logger.info(f"📊 Найдено {len(df)} строк, {len(df.columns)} колонок")
@@ -235,37 +540,34 @@ class UniversalDataFormatter:
                 # Генерируем данные на основе статистики
                 count = 5  # по умолчанию
                 try:
-                    for _, row in df.iterrows():
-                        if 'количество' in str(row.iloc[0]).lower():
-                            count = int(row.iloc[1])
+                    for label, value in df.itertuples(index=False, name=None):
+                        if 'количество' in str(label).lower():
+                            count = int(value)
                             break
                 except:
                     pass
                 
-                formatted_data = []
-                for i in range(count):
-                    row_data = {}
-                    for col_name in self.target_schema['columns'].keys():
-                        row_data[col_name] = self.generate_missing_value(col_name)
-                    formatted_data.append(row_data)
+                formatted_data = self._generate_records(count)
             else:
-                # Обычный Excel с данными
-                formatted_data = []
-                for _, row in df.iterrows():
-                    formatted_row = {}
-                    row_dict = row.to_dict()
-                    
-                    for col_name in self.target_schema['columns'].keys():
-                        source_value = None
-                        for source_col, value in row_dict.items():
-                            if (col_name.lower() in str(source_col).lower() or
-                                str(source_col).lower() in col_name.lower()):
-                                source_value = value
-                                break
-                        
-                        formatted_row[col_name] = self.generate_missing_value(col_name, source_value)
+                # Обычный Excel с данными: сопоставляем колонки один раз
+                # и обрабатываем данные по колонкам, а не через iterrows()
+                mapping = self._resolve_mapping(df.columns)
+                
+                columns_data = []
+                for col_name in self.columns:
+                    source_col = mapping.get(col_name)
+                    if source_col is None:
+                        columns_data.append(self._fill_column(col_name, [None] * len(df)))
+                        continue
                     
-                    formatted_data.append(formatted_row)
+                    # Пустые ячейки (NaN) записываются как NULL, как и при построчной
+                    # обработке; генерируются значения только для '', 'None' и нулей
+                    series = df[source_col]
+                    present = series.notna()
+                    filled = iter(self._fill_column(col_name, series[present].astype(object).tolist()))
+                    columns_data.append([next(filled) if ok else None for ok in present.tolist()])
+                
+                formatted_data = self._build_records(columns_data)
             
             return self._save_formatted_data(formatted_data, f"excel_{os.path.basename(excel_path)}")
             
@@ -273,31 +575,35 @@ class UniversalDataFormatter:
             logger.error(f"Ошибка форматирования Excel: {e}")
             return False
     
-    def _save_formatted_data(self, data: List[Dict], source_label: str) -> bool:
+    def _save_formatted_data(self, data: Iterable[Dict], source_label: str) -> bool:
         """Сохраняет отформатированные данные в целевую БД"""
         try:
-            self.create_target_database()
+            # При массовой загрузке индексы строятся после нее (см. format_all_files_in_directory)
+            self._prepare_target()
             
-            with sqlite3.connect(self.target_db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                # Подготавливаем запрос для вставки
-                columns = list(self.target_schema['columns'].keys())
-                placeholders = ','.join(['?' for _ in columns])
-                
-                insert_query = f"""
-                    INSERT OR REPLACE INTO {self.target_schema['table_name']} 
-                    ({','.join(columns)}) VALUES ({placeholders})
-                """
-                
-                # Вставляем данные
-                for row in data:
-                    values = [row.get(col, '') for col in columns]
-                    cursor.execute(insert_query, values)
+                columns = self.columns
                 
-                conn.commit()
+                # Вставляем данные пачками executemany в одной транзакции -
+                # запрос подготавливается один раз, данные могут приходить потоком
+                rows = (tuple(row.get(col, '') for col in columns) for row in data)
+                saved = 0
+                cursor.execute("BEGIN")
+                try:
+                    while True:
+                        batch = list(islice(rows, self.BATCH_SIZE))
+                        if not batch:
+                            break
+                        cursor.executemany(self.insert_sql, batch)
+                        saved += len(batch)
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
                 
-                logger.info(f"✅ Сохранено {len(data)} записей из {source_label}")
+                logger.info(f"✅ Сохранено {saved} записей из {source_label}")
                 return True
                 
         except Exception as e:
@@ -305,32 +611,101 @@ class UniversalDataFormatter:
             return False
     
     def format_all_files_in_directory(self, directory: str = "dataBD") -> Dict[str, bool]:
-        """Форматирует все файлы данных в указанной папке"""
+        """Форматирует все файлы данных в указанной папке
+        
+        Несколько Excel файлов разбираются в отдельных процессах. На macOS и Windows
+        процессы запускаются через spawn и заново импортируют главный модуль, поэтому
+        вызывающий скрипт должен запускать форматирование под if __name__ == "__main__".
+        """
         results = {}
         
         logger.info(f"🔄 Сканируем папку {directory} для форматирования файлов...")
         
-        for filename in os.listdir(directory):
-            filepath = os.path.join(directory, filename)
-            
-            if not os.path.isfile(filepath):
-                continue
-                
-            # Пропускаем целевую БД
+        # scandir отдает DirEntry с закэшированным типом файла - без лишнего stat() на каждый файл
+        with os.scandir(directory) as entries:
+            files = [(entry.name, entry.path) for entry in entries if entry.is_file()]
+        
+        # Отбираем поддерживаемые файлы; целевую БД пропускаем
+        tasks = []
+        for filename, filepath in files:
             if filepath == self.target_db_path:
                 continue
-                
-            logger.info(f"📁 Обрабатываем: {filename}")
-            
-            if filename.endswith('.xlsx') or filename.endswith('.xls'):
-                results[filename] = self.format_excel_file(filepath)
-            elif filename.endswith('.db') and filename != os.path.basename(self.target_db_path):
-                results[filename] = self.format_sqlite_db(filepath)
-            else:
+            if self._file_kind(filename) is None:
                 logger.info(f"⏭️ Пропускаем {filename} (неподдерживаемый формат)")
+                continue
+            tasks.append((filename, filepath))
+        
+        # Загружаем данные в таблицу без вторичных индексов и строим их один раз в конце
+        self._create_table()
+        self._drop_indexes()
+        self._bulk_loading = True
+        
+        try:
+            # Excel разбираем в отдельных процессах (работа на CPU), а SQLite-источники
+            # переносятся внутри движка в этом процессе
+            excel_tasks = [task for task in tasks if self._file_kind(task[0]) == 'excel']
+            parallel_results = self._format_files_parallel(excel_tasks) if len(excel_tasks) > 1 else {}
+            
+            for filename, filepath in tasks:
+                if filename in parallel_results:
+                    results[filename] = parallel_results[filename]
+                    continue
+                logger.info(f"📁 Обрабатываем: {filename}")
+                results[filename] = self._format_file(filename, filepath)
+        finally:
+            self._bulk_loading = False
+            self._create_indexes()
                 
         return results
     
+    def _file_kind(self, filename: str) -> Optional[str]:
+        """Определяет тип файла данных: 'excel', 'sqlite' или None"""
+        if filename == os.path.basename(self.target_db_path):
+            return None
+        return self.FILE_KINDS.get(os.path.splitext(filename)[1].lower())
+    
+    def _format_file(self, filename: str, filepath: str) -> bool:
+        """Форматирует один файл данных в зависимости от его типа"""
+        formatters = {'excel': self.format_excel_file, 'sqlite': self.format_sqlite_db}
+        return formatters[self._file_kind(filename)](filepath)
+    
+    def _format_files_parallel(self, tasks: List[tuple]) -> Dict[str, bool]:
+        """Форматирует файлы в отдельных процессах, запись в целевую БД - только здесь
+        
+        Процессы лишь разбирают и форматируют данные и возвращают записи,
+        поэтому за блокировку целевой БД никто не конкурирует. Если пул процессов
+        не запустился (например, при spawn без защиты __main__ в вызывающем скрипте),
+        возвращаются только обработанные файлы - остальные форматируются последовательно.
+        """
+        results = {}
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+        
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(_collect_file_records, self.target_db_path, filename, filepath): filename
+                    for filename, filepath in tasks
+                }
+                
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    try:
+                        success, batches = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Ошибка форматирования {filename}: {e}")
+                        results[filename] = False
+                        continue
+                    
+                    saved = [self._save_formatted_data(records, label) for records, label in batches]
+                    results[filename] = success and all(saved)
+                    
+        except BrokenProcessPool as e:
+            logger.warning(f"⚠️ Пул процессов недоступен, оставшиеся файлы форматируются последовательно: {e}")
+        
+        return results
+    
     def get_unified_stats(self) -> Dict:
         """Получает статистику объединенной БД"""
         try:
@@ -359,9 +734,35 @@ class UniversalDataFormatter:
             logger.error(f"Ошибка получения статистики: {e}")
             return {}
 
+class _RecordCollector(UniversalDataFormatter):
+    """Форматер для рабочих процессов: вместо записи в БД копит готовые записи"""
+    
+    DIRECT_SQLITE_INSERT = False
+    
+    def __init__(self, target_db_path: str):
+        super().__init__(target_db_path)
+        self.batches = []
+    
+    def _save_formatted_data(self, data: Iterable[Dict], source_label: str) -> bool:
+        self.batches.append((list(data), source_label))
+        return True
+
+def _collect_file_records(target_db_path: str, filename: str, filepath: str):
+    """Точка входа рабочего процесса: форматирует файл и возвращает записи"""
+    # После fork процессы наследуют одно состояние random - иначе сгенерированные
+    # id в разных файлах совпадут и перезапишут друг друга
+    random.seed()
+    logger.info(f"📁 Обрабатываем: {filename}")
+    collector = _RecordCollector(target_db_path)
+    success = collector._format_file(filename, filepath)
+    return success, collector.batches
+
 # Функция для быстрого использования
 def format_all_data_files(target_db: str = "dataBD/real_estate_data_unified.db") -> bool:
-    """Быстрое форматирование всех файлов данных"""
+    """Быстрое форматирование всех файлов данных
+    
+    Вызывать из-под if __name__ == "__main__" (см. format_all_files_in_directory)
+    """
     formatter = UniversalDataFormatter(target_db)
     results = formatter.format_all_files_in_directory()
     